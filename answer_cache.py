@@ -0,0 +1,191 @@
+"""Answer cache in front of the agent executor.
+
+Successful answers from learning_data are indexed by their query. A new
+question that is close enough to one answered recently is served from the
+stored answer instead of re-running the agent's LLM and search round trips.
+"""
+import re
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+import learning_db
+from similarity import QuerySimilarityIndex
+
+
+class CachedAnswer(NamedTuple):
+    query: str
+    response: str
+    score: float
+    age: float
+
+
+class AnswerCache:
+    """Similarity-keyed cache of agent answers with a confidence threshold and TTL.
+
+    Invalidation rules:
+    - answers older than ttl seconds are never served
+    - questions about changing facts ("latest", "today", prices, ...) bypass the cache
+    - follow-ups that refer back to the conversation ("it", "that", ...) bypass
+      the cache, since their meaning depends on the chat history
+    - a similar question only matches if it has the same content words, so
+      "capital of France" never serves the answer to "capital of Spain"
+      however high the cosine score of the rest of the sentence
+    - failed interactions and empty or error answers are never stored
+    - invalidate() and clear() drop answers explicitly
+
+    Answers stored by other server processes are picked up every
+    sync_interval seconds from learning_data. The same pass rebuilds the
+    index without expired and invalidated answers once they make up half
+    of it, so memory holds about one TTL's worth of answers.
+    """
+
+    time_sensitive = re.compile(
+        r"\b(today|tonight|tomorrow|yesterday|now|current(ly)?|latest|recent(ly)?|news|live|"
+        r"this (week|month|year)|price|prices|stock|weather|score|scores|forecast)\b", re.I
+    )
+    referential = re.compile(r"\b(it|its|that|this|those|these|they|them|he|she|him|her|above|previous)\b", re.I)
+    # Words that do not change what a question is about
+    stop_words = frozenset(
+        "a an the and or of in on at to for from by with about as is are was were be been do does did "
+        "what whats which who whom whose when where why how can could would should will shall may might "
+        "me my i you your we our please tell explain describe give show find there s".split()
+    )
+
+    def __init__(self, threshold: float = 0.9, ttl: float = 24 * 60 * 60, enabled: bool = True,
+                 sync_interval: float = 5.0):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.enabled = enabled
+        self.sync_interval = sync_interval
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self._index = None
+        # Row of the index -> (query, response, created_at), None once invalidated
+        self._answers = []
+        # Normalised query -> row, so a newer answer replaces the older one
+        self._rows: Dict[str, int] = {}
+        # Last learning_data row read and when
+        self._last_id = 0
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return ' '.join(re.findall(r"\w+", query.lower()))
+
+    @classmethod
+    def content_words(cls, query: str) -> frozenset:
+        """Lower-cased words of a question without stop words, plural 's' removed"""
+        words = (word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+                 for word in re.findall(r"\w+", query.lower()) if word not in cls.stop_words)
+        return frozenset(words)
+
+    def cacheable(self, query: str) -> bool:
+        return not (self.time_sensitive.search(query) or self.referential.search(query))
+
+    def lookup(self, query: str) -> Optional[CachedAnswer]:
+        """A fresh stored answer to a sufficiently similar question, or None"""
+        if not self.enabled:
+            return None
+        if not self.cacheable(query):
+            self.bypassed += 1
+            return None
+        self._ensure_loaded()
+        if time.monotonic() - self._synced_at > self.sync_interval:
+            self.sync()
+        with self._lock:
+            best_query, score = self._index.most_similar(query)
+            entry = self._answers[self._rows[self.normalize(best_query)]] if best_query is not None else None
+            age = time.time() - entry[2] if entry else None
+            if (entry is None or score < self.threshold or age > self.ttl
+                    or self.content_words(entry[0]) != self.content_words(query)):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return CachedAnswer(entry[0], entry[1], score, age)
+
+    def add(self, query: str, response: str, created_at: Optional[float] = None):
+        """Remember a successful answer (learning_data keeps the durable copy)"""
+        if not self.enabled or not response.strip() or response.startswith('Error') or not self.cacheable(query):
+            return
+        self._ensure_loaded()
+        with self._lock:
+            self._remember(query, response, int(created_at or time.time()))
+
+    def invalidate(self, query: str):
+        """Stop serving the stored answer for this exact (normalised) question"""
+        with self._lock:
+            row = self._rows.get(self.normalize(query))
+            if row is not None:
+                self._answers[row] = None
+
+    def clear(self):
+        with self._lock:
+            self._index = QuerySimilarityIndex()
+            self._answers = []
+            self._rows = {}
+
+    def sync(self):
+        """Add answers stored since the last load, including other processes' answers"""
+        self._ensure_loaded()
+        self._synced_at = time.monotonic()
+        try:
+            # This process's own answers are already in memory (add()), so queued writes need not be flushed
+            rows = learning_db.successful_answers(int(time.time() - self.ttl), after_id=self._last_id, flush=False)
+        except Exception as e:
+            print(f"Answer cache sync error: {e}")
+            return
+        with self._lock:
+            self._add_rows(rows)
+            self._compact()
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0
+        return (f"- Answer Cache: {self.hits} hits, {self.misses} misses ({rate:.0%} hit rate), "
+                f"{self.bypassed} bypassed, threshold {self.threshold:.2f}, TTL {self.ttl / 3600:.0f}h")
+
+    def _remember(self, query: str, response: str, created_at: int):
+        key = self.normalize(query)
+        row = self._rows.get(key)
+        if row is None:
+            self._rows[key] = len(self._answers)
+            self._answers.append((query, response, created_at))
+            self._index.add(query)
+        else:
+            self._answers[row] = (query, response, created_at)
+
+    def _ensure_loaded(self):
+        if self._index is not None:
+            return
+        with self._lock:
+            if self._index is not None:
+                return
+            self._index = QuerySimilarityIndex()
+            self._synced_at = time.monotonic()
+            try:
+                rows = learning_db.successful_answers(int(time.time() - self.ttl), flush=False)
+            except Exception as e:
+                print(f"Answer cache load error: {e}")
+                rows = []
+            self._add_rows(rows)
+
+    def _compact(self):
+        # Called with the lock held
+        cutoff = time.time() - self.ttl
+        live = [entry for entry in self._answers if entry is not None and entry[2] >= cutoff]
+        if not self._answers or len(live) * 2 > len(self._answers):
+            return
+        self._index = QuerySimilarityIndex()
+        self._answers = []
+        self._rows = {}
+        for query, response, created_at in live:
+            self._remember(query, response, created_at)
+
+    def _add_rows(self, rows):
+        for row_id, query, response, created_at in rows:
+            self._last_id = max(self._last_id, row_id)
+            if response and response.strip() and not response.startswith('Error') and self.cacheable(query):
+                self._remember(query, response, created_at)
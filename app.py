@@ -1,16 +1,24 @@
-from flask import Flask, render_template_string, request
+from flask import Flask, render_template_string, request, jsonify
 from flask_socketio import SocketIO, emit
+import os
+import subprocess
+import sys
 import uuid
 from datetime import datetime
+import signal
+import socket
+import statistics
 import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 
 # Import your existing agent code
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from langchain_anthropic import ChatAnthropic
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import PydanticOutputParser
-from langchain.agents import create_tool_calling_agent, AgentExecutor
 from tools import (
     search_tool, 
     wiki_tool, 
@@ -18,15 +26,36 @@ from tools import (
     enhanced_search_tool, 
     learning_analysis_tool,
     learning_viewer_tool,
-    custom_search_engine
+    analyze_learning_data,
+    view_learning_data,
+    context_budget,
+    warm_up
 )
-import sqlite3
+import learning_db
+from search_providers import registry as search_registry
+from conversation_memory import ConversationMemory, message_text
+from answer_cache import AnswerCache
+from message_queue import client_manager
 
 load_dotenv()
 
+# Multi-process serving (see serve_workers): worker processes relay Socket.IO
+# events to each other through this queue, e.g. redis://localhost:6379/0, or
+# sqlite:///socketio_queue.db as a stand-in broker on one machine
+MESSAGE_QUEUE = os.environ.get('MESSAGE_QUEUE')
+SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', '1'))
+
+socketio_options = {}
+if MESSAGE_QUEUE:
+    manager = client_manager(MESSAGE_QUEUE)
+    socketio_options = {'client_manager': manager} if manager else {'message_queue': MESSAGE_QUEUE}
+if SERVER_WORKERS > 1:
+    # Workers share one listening socket, so only a WebSocket keeps a client on one process
+    socketio_options['transports'] = ['websocket']
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'your-secret-key-here'
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading')
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', **socketio_options)
 
 # Initialize your agent
 class ResearchResponse(BaseModel):
@@ -36,7 +65,9 @@ class ResearchResponse(BaseModel):
     tools_used: list[str]
     learning_insights: str = ""
 
-llm = ChatAnthropic(model="claude-sonnet-4-20250514")
+# Push partial tokens and tool events to the browser while the agent runs
+STREAM_RESPONSES = True
+
 parser = PydanticOutputParser(pydantic_object=ResearchResponse)
 
 prompt = ChatPromptTemplate.from_messages([
@@ -52,38 +83,291 @@ prompt = ChatPromptTemplate.from_messages([
 ])
 
 tools = [enhanced_search_tool, wiki_tool, save_tool, learning_analysis_tool, learning_viewer_tool, search_tool]
-agent = create_tool_calling_agent(llm=llm, prompt=prompt, tools=tools)
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=False)
+_agent_executor = None
+_agent_lock = threading.Lock()
+
+def get_agent_executor():
+    """Build the agent on first use; langchain.agents and the Anthropic client are slow to import"""
+    global _agent_executor
+    if _agent_executor is None:
+        with _agent_lock:
+            if _agent_executor is None:
+                from langchain_anthropic import ChatAnthropic
+                from langchain.agents import create_tool_calling_agent
+                from parallel_agent import ParallelAgentExecutor
+                
+                llm = ChatAnthropic(model="claude-sonnet-4-20250514", streaming=STREAM_RESPONSES)
+                agent = create_tool_calling_agent(llm=llm, prompt=prompt, tools=tools)
+                _agent_executor = ParallelAgentExecutor(agent=agent, tools=tools, verbose=False,
+                                                        context_budget=context_budget)
+    return _agent_executor
+
+def warm_up_in_background():
+    """Load the agent and search clients without delaying server start"""
+    def load():
+        try:
+            get_agent_executor()
+            warm_up()
+        except Exception as e:
+            print(f"Warm-up error: {e}")
+    threading.Thread(target=load, name='warm-up', daemon=True).start()
 
 def store_interaction_learning(query: str, response: dict, success: bool = True):
     """Store interaction data for learning"""
     try:
-        conn = sqlite3.connect('agent_learning.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            INSERT INTO learning_data 
-            (query, response, tools_used, success_rating, timestamp)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (
+        learning_db.record_interaction(
             query,
-            str(response.get('output', ''))[:1000],
+            # The full answer text; the answer cache serves it back verbatim
+            message_text(response.get('output', '')),
             'ai_tools',
-            1.0 if success else 0.0,
-            datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        ))
-        
-        conn.commit()
-        conn.close()
+            1.0 if success else 0.0
+        )
     except Exception as e:
         print(f"Learning storage error: {e}")
 
+class StreamingMetrics:
+    """Rolling record of time-to-first-visible-token per streamed answer"""
+    
+    def __init__(self, window: int = 500):
+        self.window = window
+        self.samples = []
+        self.lock = threading.Lock()
+    
+    def record(self, seconds: float):
+        with self.lock:
+            self.samples.append(seconds)
+            del self.samples[:-self.window]
+    
+    def summary(self) -> dict:
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return {'count': 0}
+        return {
+            'count': len(samples),
+            'ttft_mean_ms': round(statistics.mean(samples) * 1000),
+            'ttft_p50_ms': round(statistics.median(samples) * 1000),
+            'ttft_p95_ms': round(samples[int(len(samples) * 0.95) - 1] * 1000) if len(samples) >= 20 else None,
+        }
+
+streaming_metrics = StreamingMetrics()
+
+class SocketStreamHandler(BaseCallbackHandler):
+    """Forward LLM tokens and tool start/finish events to one Socket.IO client"""
+    
+    def __init__(self, client_sid: str, started_at: float):
+        self.client_sid = client_sid
+        self.started_at = started_at
+        self.first_token_at = None
+        self.tool_names = {}
+    
+    def on_llm_new_token(self, token, **kwargs):
+        text = message_text(token)
+        if not text:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            streaming_metrics.record(self.first_token_at - self.started_at)
+        socketio.emit('ai_token', {'token': text}, to=self.client_sid)
+    
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get('name') or kwargs.get('name', 'tool')
+        self.tool_names[run_id] = name
+        socketio.emit('tool_start', {'tool': name, 'input': str(input_str)[:200]}, to=self.client_sid)
+    
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        name = self.tool_names.pop(run_id, kwargs.get('name', 'tool'))
+        socketio.emit('tool_end', {'tool': name}, to=self.client_sid)
+    
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        name = self.tool_names.pop(run_id, kwargs.get('name', 'tool'))
+        socketio.emit('tool_end', {'tool': name, 'error': str(error)[:200]}, to=self.client_sid)
+    
+    @property
+    def ttft_ms(self):
+        if self.first_token_at is None:
+            return None
+        return round((self.first_token_at - self.started_at) * 1000)
+
+class AdmissionController:
+    """Fixed-size agent worker pool with a bounded wait queue.
+    
+    At most max_workers queries run at once and at most per_session of them
+    belong to the same chat session. Up to max_queue more wait in FIFO
+    order (a session may hold max_pending_per_session of those); anything
+    beyond that is rejected so a burst cannot pile up unbounded work.
+    """
+    
+    def __init__(self, max_workers: int = 4, max_queue: int = 32, per_session: int = 1,
+                 max_pending_per_session: int = 3, on_position=None):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.per_session = per_session
+        self.max_pending_per_session = max_pending_per_session
+        self.on_position = on_position
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='agent')
+        self.lock = threading.Lock()
+        self.waiting = deque()
+        self.running = Counter()
+    
+    def submit(self, session_id: str, client_sid: str, job) -> bool:
+        """Run job now or queue it; returns False when it has to be rejected"""
+        with self.lock:
+            pending = sum(1 for entry in self.waiting if entry[0] == session_id)
+            if len(self.waiting) >= self.max_queue or pending >= self.max_pending_per_session:
+                return False
+            self.waiting.append((session_id, client_sid, job))
+            self._dispatch()
+            positions = self._positions()
+        self._notify(positions)
+        return True
+    
+    def cancel(self, session_id: str) -> int:
+        """Drop a session's queued jobs (e.g. its client disconnected); returns how many were dropped"""
+        with self.lock:
+            kept = deque(entry for entry in self.waiting if entry[0] != session_id)
+            dropped = len(self.waiting) - len(kept)
+            self.waiting = kept
+            positions = self._positions() if dropped else []
+        self._notify(positions)
+        return dropped
+    
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'running': sum(self.running.values()),
+                'queued': len(self.waiting),
+                'max_workers': self.max_workers,
+                'max_queue': self.max_queue,
+            }
+    
+    def _dispatch(self) -> int:
+        # Called with the lock held: start every waiting job that has a free slot
+        started = 0
+        for entry in list(self.waiting):
+            if sum(self.running.values()) >= self.max_workers:
+                break
+            session_id = entry[0]
+            if self.running[session_id] >= self.per_session:
+                continue
+            self.waiting.remove(entry)
+            self.running[session_id] += 1
+            self.executor.submit(self._run, entry)
+            started += 1
+        return started
+    
+    def _run(self, entry):
+        session_id, _, job = entry
+        try:
+            job()
+        finally:
+            with self.lock:
+                self.running[session_id] -= 1
+                if not self.running[session_id]:
+                    del self.running[session_id]
+                started = self._dispatch()
+                positions = self._positions() if started else []
+            self._notify(positions)
+    
+    def _positions(self):
+        return [(client_sid, position) for position, (_, client_sid, _) in enumerate(self.waiting, 1)]
+    
+    def _notify(self, positions):
+        if self.on_position:
+            for client_sid, position in positions:
+                self.on_position(client_sid, position)
+
+admission = AdmissionController(
+    on_position=lambda client_sid, position: socketio.emit('queued', {'position': position}, to=client_sid)
+)
+
+class SessionRegistry:
+    """Chat sessions indexed by session id and by Socket.IO sid.
+    
+    Sessions are dropped when their socket disconnects or after idle_ttl
+    seconds without a message, and each session's conversation memory is
+    capped at history_tokens.
+    """
+    
+    def __init__(self, idle_ttl: float = 30 * 60, history_tokens: int = 1500,
+                 sweep_interval: float = 60):
+        self.idle_ttl = idle_ttl
+        self.history_tokens = history_tokens
+        self.sweep_interval = sweep_interval
+        self.sessions = {}
+        self.by_sid = {}
+        self.lock = threading.Lock()
+        self.sweeper = None
+    
+    def __len__(self):
+        return len(self.sessions)
+    
+    def create(self, client_sid: str) -> str:
+        session_id = str(uuid.uuid4())
+        with self.lock:
+            self.sessions[session_id] = {
+                'history': ConversationMemory(max_tokens=self.history_tokens),
+                'created': datetime.now(),
+                'last_active': time.monotonic(),
+                'sid': client_sid
+            }
+            self.by_sid[client_sid] = session_id
+        self._start_sweeper()
+        return session_id
+    
+    def find_by_sid(self, client_sid: str):
+        """Return (session_id, session) for a socket, or (None, None)"""
+        with self.lock:
+            session_id = self.by_sid.get(client_sid)
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None, None
+            session['last_active'] = time.monotonic()
+            return session_id, session
+    
+    def remove_by_sid(self, client_sid: str):
+        with self.lock:
+            session_id = self.by_sid.pop(client_sid, None)
+            self.sessions.pop(session_id, None)
+        return session_id
+    
+    def history(self, session_id: str) -> ConversationMemory:
+        with self.lock:
+            session = self.sessions.get(session_id)
+        # Sessions removed mid-query still get a throwaway memory
+        return session['history'] if session else ConversationMemory(max_tokens=self.history_tokens)
+    
+    def evict_idle(self) -> int:
+        cutoff = time.monotonic() - self.idle_ttl
+        with self.lock:
+            idle = [sid for sid, session in self.sessions.items() if session['last_active'] < cutoff]
+            for session_id in idle:
+                session = self.sessions.pop(session_id)
+                self.by_sid.pop(session['sid'], None)
+        return len(idle)
+    
+    def _start_sweeper(self):
+        if self.sweeper is None:
+            with self.lock:
+                if self.sweeper is None:
+                    self.sweeper = threading.Thread(target=self._sweep, name='session-sweeper', daemon=True)
+                    self.sweeper.start()
+    
+    def _sweep(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            evicted = self.evict_idle()
+            if evicted:
+                print(f"Evicted {evicted} idle chat sessions")
+
 # Store chat sessions
-chat_sessions = {}
+chat_sessions = SessionRegistry()
 
-@app.route('/')
-def index():
-    return render_template_string('''
+# Recent answers to similar questions, shared by every session
+answer_cache = AnswerCache()
+
+# Pages are plain HTML (no template variables) so the asyncio server can serve them too
+INDEX_PAGE = '''
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -138,11 +422,9 @@ def index():
         </div>
     </body>
     </html>
-    ''')
+    '''
 
-@app.route('/chat')
-def chat():
-    return render_template_string('''
+CHAT_PAGE = '''
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -218,7 +500,7 @@ def chat():
                                 <i class="fas fa-circle text-xs mr-1"></i>
                                 <i class="fas fa-circle text-xs mr-1"></i>
                                 <i class="fas fa-circle text-xs"></i>
-                                <span class="ml-2 text-gray-600">Researching...</span>
+                                <span id="typing-text" class="ml-2 text-gray-600">Researching...</span>
                             </div>
                         </div>
                     </div>
@@ -254,7 +536,8 @@ def chat():
         <script>
         console.log('Chat page loaded');
 
-        const socket = io();
+        // WebSocket first: one long-lived connection stays on one server process
+        const socket = io({transports: ['websocket', 'polling']});
         let sessionId = null;
         let connected = false;
 
@@ -263,6 +546,7 @@ def chat():
         const messageInput = document.getElementById('message-input');
         const sendButton = document.getElementById('send-button');
         const typingIndicator = document.getElementById('typing-indicator');
+        const typingText = document.getElementById('typing-text');
         const statusText = document.getElementById('status-text');
         const connectionStatus = document.getElementById('connection-status');
 
@@ -371,6 +655,7 @@ def chat():
         // Clear chat
         document.getElementById('clear-chat').addEventListener('click', () => {
             if (confirm('Clear chat history?')) {
+                socket.emit('clear_history');
                 messagesContainer.innerHTML = `
                     <div class="flex items-start space-x-3">
                         <div class="bg-blue-600 rounded-full p-2 text-white">
@@ -395,12 +680,84 @@ def chat():
             addMessage(data.message, true, data.timestamp);
         });
 
+        // Draft bubble that fills in while the answer streams
+        let draftMessage = null;
+        let draftText = null;
+        let draftTools = null;
+
+        function ensureDraft() {
+            if (!draftMessage) {
+                draftMessage = document.createElement('div');
+                draftMessage.className = 'flex items-start space-x-3';
+                draftMessage.innerHTML = `
+                    <div class="bg-blue-600 rounded-full p-2 text-white">
+                        <i class="fas fa-robot"></i>
+                    </div>
+                    <div class="bg-blue-50 rounded-lg p-3 max-w-2xl">
+                        <div class="draft-tools text-xs text-gray-500"></div>
+                        <p class="draft-text text-gray-800 whitespace-pre-wrap"></p>
+                    </div>
+                `;
+                draftText = draftMessage.querySelector('.draft-text');
+                draftTools = draftMessage.querySelector('.draft-tools');
+                messagesContainer.appendChild(draftMessage);
+            }
+        }
+
+        function clearDraft() {
+            if (draftMessage) {
+                draftMessage.remove();
+            }
+            draftMessage = draftText = draftTools = null;
+        }
+
+        function setToolLine(line, icon, text) {
+            line.innerHTML = `<i class="fas fa-${icon} mr-1"></i>`;
+            line.appendChild(document.createTextNode(text));
+        }
+
+        socket.on('ai_token', (data) => {
+            ensureDraft();
+            typingIndicator.classList.add('hidden');
+            draftText.textContent += data.token;
+            scrollToBottom();
+        });
+
+        socket.on('tool_start', (data) => {
+            ensureDraft();
+            if (draftText.textContent && !draftText.textContent.endsWith('\\n\\n')) {
+                draftText.textContent += '\\n\\n';
+            }
+            const line = document.createElement('div');
+            line.dataset.tool = data.tool;
+            setToolLine(line, 'cog fa-spin', `Using ${data.tool}...`);
+            draftTools.appendChild(line);
+            scrollToBottom();
+        });
+
+        socket.on('tool_end', (data) => {
+            if (!draftTools) return;
+            const line = [...draftTools.children].find(el => el.dataset.tool === data.tool && !el.dataset.done);
+            if (line) {
+                line.dataset.done = '1';
+                setToolLine(line, data.error ? 'times' : 'check', data.error ? `${data.tool} failed` : `${data.tool} done`);
+            }
+        });
+
         socket.on('ai_response', (data) => {
+            clearDraft();
             addMessage(data.message, false, data.timestamp, data.error || false);
             sendButton.disabled = false;
         });
 
+        socket.on('queued', (data) => {
+            typingText.textContent = `Queued, position ${data.position}...`;
+            typingIndicator.classList.remove('hidden');
+            scrollToBottom();
+        });
+
         socket.on('typing', (data) => {
+            typingText.textContent = 'Researching...';
             if (data.typing) {
                 typingIndicator.classList.remove('hidden');
             } else {
@@ -416,38 +773,63 @@ def chat():
         </script>
     </body>
     </html>
-    ''')
+    '''
+
+@app.route('/')
+def index():
+    return render_template_string(INDEX_PAGE)
+
+@app.route('/api/metrics')
+def metrics():
+    return jsonify({
+        'worker': os.getpid(),
+        'streaming': streaming_metrics.summary(),
+        'workers': admission.stats(),
+        'sessions': len(chat_sessions),
+        'answer_cache': {
+            'hits': answer_cache.hits,
+            'misses': answer_cache.misses,
+            'bypassed': answer_cache.bypassed
+        },
+        'search_providers': search_registry.snapshot()
+    })
+
+@app.route('/chat')
+def chat():
+    return render_template_string(CHAT_PAGE)
 
 @socketio.on('connect')
 def handle_connect(auth):
-    session_id = str(uuid.uuid4())
-    chat_sessions[session_id] = {
-        'history': [],
-        'created': datetime.now(),
-        'sid': request.sid
-    }
+    session_id = chat_sessions.create(request.sid)
     emit('connected', {'session_id': session_id})
     print(f"Client connected: {session_id}")
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    print('Client disconnected')
+    session_id = chat_sessions.remove_by_sid(request.sid)
+    # Nobody is left to read the answers to its queued questions
+    if session_id and admission.cancel(session_id):
+        print(f'Dropped queued questions of {session_id}')
+    print(f'Client disconnected: {session_id}')
+
+@socketio.on('clear_history')
+def handle_clear_history():
+    session_id, _ = chat_sessions.find_by_sid(request.sid)
+    if session_id:
+        chat_sessions.history(session_id).clear()
 
 @socketio.on('send_message')
 def handle_message(data):
     user_message = data['message']
     client_sid = request.sid
     
-    # Find session by socket ID
-    session_id = None
-    for sid, session_data in chat_sessions.items():
-        if session_data.get('sid') == client_sid:
-            session_id = sid
-            break
+    # Find session by socket ID; sessions evicted while idle start over
+    session_id, session = chat_sessions.find_by_sid(client_sid)
     
     if not session_id:
-        emit('error', {'message': 'Session not found'})
-        return
+        session_id = chat_sessions.create(client_sid)
+        emit('connected', {'session_id': session_id})
+    history = chat_sessions.history(session_id)
     
     print(f"Processing: {user_message}")
     
@@ -457,19 +839,40 @@ def handle_message(data):
         'timestamp': datetime.now().isoformat()
     })
     
-    # Show typing
-    emit('typing', {'typing': True})
+    started_at = time.perf_counter()
+    
+    # Repeated questions are answered from the cache without a worker or LLM call
+    cached = answer_cache.lookup(user_message) if user_message.lower() not in ('analyze', 'view', 'view learning') else None
+    if cached:
+        history.add_exchange(user_message, cached.response)
+        emit('ai_response', {
+            'message': cached.response.strip(),
+            'timestamp': datetime.now().isoformat(),
+            'cached': True,
+            'similar_to': cached.query
+        })
+        return
     
     def process_query():
+        stream_handler = None
+        # Show typing
+        socketio.emit('typing', {'typing': True}, to=client_sid)
         try:
             # Process the query
             if user_message.lower() == 'analyze':
-                response_text = learning_analysis_tool.func()
+                response_text = analyze_learning_data() + "\n" + answer_cache.summary()
             elif user_message.lower() in ['view learning', 'view']:
-                response_text = learning_viewer_tool.func()
+                response_text = view_learning_data()
             else:
                 # Run your AI agent
-                raw_response = agent_executor.invoke({"query": user_message})
+                config = {}
+                if STREAM_RESPONSES:
+                    stream_handler = SocketStreamHandler(client_sid, started_at)
+                    config['callbacks'] = [stream_handler]
+                raw_response = get_agent_executor().invoke(
+                    {"query": user_message, "chat_history": history.messages()},
+                    config=config
+                )
                 
                 # FIXED: Extract clean text response
                 output = raw_response.get('output', '')
@@ -489,13 +892,18 @@ def handle_message(data):
                 if not response_text.strip():
                     response_text = "I couldn't generate a proper response. Please try rephrasing your question."
                 
+                # Remember the exchange for follow-up questions
+                history.add_exchange(user_message, response_text)
+                
                 # Store for learning
                 store_interaction_learning(user_message, raw_response, True)
+                answer_cache.add(user_message, message_text(output))
             
             # Send clean response
             socketio.emit('ai_response', {
                 'message': response_text.strip(),
-                'timestamp': datetime.now().isoformat()
+                'timestamp': datetime.now().isoformat(),
+                'ttft_ms': stream_handler.ttft_ms if stream_handler else None
             }, to=client_sid)
             
         except Exception as e:
@@ -510,12 +918,105 @@ def handle_message(data):
             # Stop typing
             socketio.emit('typing', {'typing': False}, to=client_sid)
     
-    # Process in thread
-    thread = threading.Thread(target=process_query)
-    thread.daemon = True
-    thread.start()
+    # Process on the bounded worker pool
+    if not admission.submit(session_id, client_sid, process_query):
+        emit('error', {'message': 'The assistant is busy right now. Please wait for your current questions to finish and try again.'})
+
+# Threads per gunicorn worker; every open WebSocket holds one of them
+WORKER_THREADS = int(os.environ.get('WORKER_THREADS', '100'))
+
+def worker_app():
+    """WSGI app for one gunicorn worker process (gunicorn 'app:worker_app()')"""
+    warm_up_in_background()
+    return app
+
+def run_worker(listen_fd: int, host: str):
+    """Serve on a listening socket inherited from serve_workers (fallback without gunicorn)"""
+    from werkzeug.serving import make_server
+    
+    warm_up_in_background()
+    server = make_server(host, 0, app, threaded=True, fd=listen_fd)
+    print(f"Worker {os.getpid()} ready")
+    server.serve_forever()
+
+def serve_workers(workers: int, host: str = '0.0.0.0', port: int = 5000, message_queue: str = None):
+    """Run `workers` server processes accepting connections on one port.
+    
+    Uses gunicorn's threaded (gthread) worker, the production setup
+    Flask-SocketIO documents for async_mode='threading' with simple-websocket;
+    gunicorn also restarts workers that die. Without gunicorn (e.g. on
+    Windows) the workers are Werkzeug threaded servers sharing one listening
+    socket, which is fine for local testing but not hardened for production.
+    
+    The kernel hands each new connection to one of the processes. Chat
+    sessions live in the process holding the client's WebSocket; learning
+    state is shared through agent_learning.db and Socket.IO events through
+    the message queue.
+    """
+    # Stop the workers on SIGTERM too, not only on Ctrl+C
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    env = {**os.environ, 'SERVER_WORKERS': str(workers)}
+    if message_queue:
+        env['MESSAGE_QUEUE'] = message_queue
+    
+    listener = None
+    try:
+        import gunicorn
+    except ImportError:
+        gunicorn = None
+    if gunicorn:
+        # Workers import the app themselves, so they see SERVER_WORKERS and MESSAGE_QUEUE
+        command = [
+            sys.executable, '-m', 'gunicorn', 'app:worker_app()',
+            '--chdir', os.path.dirname(os.path.abspath(__file__)),
+            '--bind', f'{host}:{port}', '--workers', str(workers),
+            '--worker-class', 'gthread', '--threads', str(WORKER_THREADS),
+        ]
+        processes = [subprocess.Popen(command, env=env)]
+    else:
+        print("⚠️ gunicorn is not installed; falling back to Werkzeug worker processes")
+        listener = socket.create_server((host, port), backlog=1024)
+        command = [sys.executable, os.path.abspath(__file__), '--listen-fd', str(listener.fileno()), '--host', host]
+        processes = [
+            subprocess.Popen(command, pass_fds=[listener.fileno()], env=env)
+            for _ in range(workers)
+        ]
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+        if listener:
+            listener.close()
 
 if __name__ == '__main__':
-    print("🚀 Starting AI Research Assistant...")
-    print("🌐 Open: http://localhost:5000")
-    socketio.run(app, debug=True, host='0.0.0.0', port=5000, allow_unsafe_werkzeug=True)
\ No newline at end of file
+    import argparse
+    
+    cli = argparse.ArgumentParser(description="AI Research Assistant web UI")
+    cli.add_argument('--host', default='0.0.0.0')
+    cli.add_argument('--port', type=int, default=5000)
+    cli.add_argument('--workers', type=int,
+                     help="serve with this many processes instead of the debug server; more than one needs --message-queue")
+    cli.add_argument('--message-queue', default=MESSAGE_QUEUE,
+                     help="Socket.IO queue URL shared by the workers (redis://..., or sqlite:///file.db locally)")
+    cli.add_argument('--listen-fd', type=int, help=argparse.SUPPRESS)
+    args = cli.parse_args()
+    
+    if args.listen_fd is not None:
+        run_worker(args.listen_fd, args.host)
+    elif args.workers:
+        if args.workers > 1 and not args.message_queue:
+            cli.error("--workers needs --message-queue (or MESSAGE_QUEUE) so workers can reach each other's clients")
+        print(f"🚀 Starting AI Research Assistant with {args.workers} workers...")
+        print(f"🌐 Open: http://localhost:{args.port}")
+        serve_workers(args.workers, args.host, args.port, args.message_queue)
+    else:
+        print("🚀 Starting AI Research Assistant...")
+        print(f"🌐 Open: http://localhost:{args.port}")
+        warm_up_in_background()
+        socketio.run(app, debug=True, host=args.host, port=args.port, allow_unsafe_werkzeug=True)
\ No newline at end of file
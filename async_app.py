@@ -0,0 +1,263 @@
+"""asyncio serving path for the chat UI.
+
+Runs the same pages and Socket.IO events as app.py, but on a
+python-socketio AsyncServer under aiohttp. Each query is a coroutine driving
+agent_executor.ainvoke(): LLM calls, tool calls and web fetches are awaited
+on one event loop instead of holding an OS thread per in-flight query, so a
+single process can serve hundreds of concurrent research sessions.
+
+    python async_app.py
+"""
+import asyncio
+import time
+from collections import Counter
+from datetime import datetime
+
+import socketio
+from aiohttp import web
+from langchain_core.callbacks import AsyncCallbackHandler
+
+from app import (
+    CHAT_PAGE,
+    INDEX_PAGE,
+    SessionRegistry,
+    StreamingMetrics,
+    STREAM_RESPONSES,
+    get_agent_executor,
+    store_interaction_learning,
+    warm_up_in_background,
+)
+from answer_cache import AnswerCache
+from conversation_memory import message_text
+from search_providers import registry as search_registry
+from tools import aanalyze_learning_data, aview_learning_data
+
+sio = socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins='*')
+web_app = web.Application()
+sio.attach(web_app)
+
+streaming_metrics = StreamingMetrics()
+chat_sessions = SessionRegistry()
+answer_cache = AnswerCache()
+
+
+class AsyncSocketStreamHandler(AsyncCallbackHandler):
+    """Forward LLM tokens and tool start/finish events to one Socket.IO client"""
+
+    def __init__(self, client_sid: str, started_at: float):
+        self.client_sid = client_sid
+        self.started_at = started_at
+        self.first_token_at = None
+        self.tool_names = {}
+
+    async def on_llm_new_token(self, token, **kwargs):
+        text = message_text(token)
+        if not text:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            streaming_metrics.record(self.first_token_at - self.started_at)
+        await sio.emit('ai_token', {'token': text}, to=self.client_sid)
+
+    async def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        name = (serialized or {}).get('name') or kwargs.get('name', 'tool')
+        self.tool_names[run_id] = name
+        await sio.emit('tool_start', {'tool': name, 'input': str(input_str)[:200]}, to=self.client_sid)
+
+    async def on_tool_end(self, output, *, run_id, **kwargs):
+        name = self.tool_names.pop(run_id, kwargs.get('name', 'tool'))
+        await sio.emit('tool_end', {'tool': name}, to=self.client_sid)
+
+    async def on_tool_error(self, error, *, run_id, **kwargs):
+        name = self.tool_names.pop(run_id, kwargs.get('name', 'tool'))
+        await sio.emit('tool_end', {'tool': name, 'error': str(error)[:200]}, to=self.client_sid)
+
+    @property
+    def ttft_ms(self):
+        if self.first_token_at is None:
+            return None
+        return round((self.first_token_at - self.started_at) * 1000)
+
+
+class AsyncAdmission:
+    """Caps concurrently running queries; the rest wait in FIFO order.
+
+    At most per_session queries of one session may be running or waiting,
+    and at most max_queue queries wait overall; anything beyond is rejected.
+    """
+
+    def __init__(self, max_running: int = 256, max_queue: int = 1024, per_session: int = 3):
+        self.max_running = max_running
+        self.max_queue = max_queue
+        self.per_session = per_session
+        self.semaphore = asyncio.Semaphore(max_running)
+        self.active = Counter()
+        self.waiting = 0
+
+    async def run(self, session_id: str, client_sid: str, job) -> bool:
+        """Run job once a slot is free; returns False when it has to be rejected"""
+        if self.active[session_id] >= self.per_session or self.waiting >= self.max_queue:
+            return False
+        self.active[session_id] += 1
+        try:
+            if self.semaphore.locked():
+                self.waiting += 1
+                await sio.emit('queued', {'position': self.waiting}, to=client_sid)
+                try:
+                    await self.semaphore.acquire()
+                finally:
+                    self.waiting -= 1
+            else:
+                await self.semaphore.acquire()
+            try:
+                await job()
+            finally:
+                self.semaphore.release()
+        finally:
+            self.active[session_id] -= 1
+            if not self.active[session_id]:
+                del self.active[session_id]
+        return True
+
+    def stats(self) -> dict:
+        return {
+            'running': self.max_running - self.semaphore._value,
+            'queued': self.waiting,
+            'max_running': self.max_running,
+            'max_queue': self.max_queue,
+        }
+
+
+admission = AsyncAdmission()
+
+
+async def index(request):
+    return web.Response(text=INDEX_PAGE, content_type='text/html')
+
+async def chat(request):
+    return web.Response(text=CHAT_PAGE, content_type='text/html')
+
+async def metrics(request):
+    return web.json_response({
+        'streaming': streaming_metrics.summary(),
+        'workers': admission.stats(),
+        'sessions': len(chat_sessions),
+        'answer_cache': {
+            'hits': answer_cache.hits,
+            'misses': answer_cache.misses,
+            'bypassed': answer_cache.bypassed
+        },
+        'search_providers': search_registry.snapshot()
+    })
+
+web_app.router.add_get('/', index)
+web_app.router.add_get('/chat', chat)
+web_app.router.add_get('/api/metrics', metrics)
+
+
+@sio.event
+async def connect(sid, environ, auth=None):
+    session_id = chat_sessions.create(sid)
+    await sio.emit('connected', {'session_id': session_id}, to=sid)
+    print(f"Client connected: {session_id}")
+
+@sio.event
+async def disconnect(sid, *args):
+    session_id = chat_sessions.remove_by_sid(sid)
+    print(f'Client disconnected: {session_id}')
+
+@sio.on('clear_history')
+async def handle_clear_history(sid):
+    session_id, _ = chat_sessions.find_by_sid(sid)
+    if session_id:
+        chat_sessions.history(session_id).clear()
+
+@sio.on('send_message')
+async def handle_message(sid, data):
+    user_message = data['message']
+
+    # Find session by socket ID; sessions evicted while idle start over
+    session_id, _ = chat_sessions.find_by_sid(sid)
+    if not session_id:
+        session_id = chat_sessions.create(sid)
+        await sio.emit('connected', {'session_id': session_id}, to=sid)
+    history = chat_sessions.history(session_id)
+
+    print(f"Processing: {user_message}")
+    await sio.emit('user_message', {
+        'message': str(user_message),
+        'timestamp': datetime.now().isoformat()
+    }, to=sid)
+
+    started_at = time.perf_counter()
+
+    command = user_message.lower()
+    # The answer cache and learning store read and write SQLite, so they stay off the event loop
+    cached = None
+    if command not in ('analyze', 'view', 'view learning'):
+        cached = await asyncio.to_thread(answer_cache.lookup, user_message)
+    if cached:
+        history.add_exchange(user_message, cached.response)
+        await sio.emit('ai_response', {
+            'message': cached.response.strip(),
+            'timestamp': datetime.now().isoformat(),
+            'cached': True,
+            'similar_to': cached.query
+        }, to=sid)
+        return
+
+    async def process_query():
+        stream_handler = None
+        await sio.emit('typing', {'typing': True}, to=sid)
+        try:
+            if command == 'analyze':
+                response_text = await aanalyze_learning_data() + "\n" + answer_cache.summary()
+            elif command in ['view learning', 'view']:
+                response_text = await aview_learning_data()
+            else:
+                config = {}
+                if STREAM_RESPONSES:
+                    stream_handler = AsyncSocketStreamHandler(sid, started_at)
+                    config['callbacks'] = [stream_handler]
+                # Built once; blocking only until the warm-up thread has finished
+                agent_executor = await asyncio.to_thread(get_agent_executor)
+                raw_response = await agent_executor.ainvoke(
+                    {"query": user_message, "chat_history": history.messages()},
+                    config=config
+                )
+
+                output = raw_response.get('output', '')
+                response_text = message_text(output)
+                if not response_text.strip():
+                    response_text = "I couldn't generate a proper response. Please try rephrasing your question."
+
+                history.add_exchange(user_message, response_text)
+                await asyncio.to_thread(store_interaction_learning, user_message, raw_response, True)
+                await asyncio.to_thread(answer_cache.add, user_message, message_text(output))
+
+            await sio.emit('ai_response', {
+                'message': response_text.strip(),
+                'timestamp': datetime.now().isoformat(),
+                'ttft_ms': stream_handler.ttft_ms if stream_handler else None
+            }, to=sid)
+
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            await sio.emit('ai_response', {
+                'message': f"Sorry, I encountered an error: {str(e)}",
+                'timestamp': datetime.now().isoformat(),
+                'error': True
+            }, to=sid)
+
+        finally:
+            await sio.emit('typing', {'typing': False}, to=sid)
+
+    if not await admission.run(session_id, sid, process_query):
+        await sio.emit('error', {'message': 'The assistant is busy right now. Please wait for your current questions to finish and try again.'}, to=sid)
+
+
+if __name__ == '__main__':
+    print("🚀 Starting AI Research Assistant (asyncio server)...")
+    print("🌐 Open: http://localhost:5000")
+    warm_up_in_background()
+    web.run_app(web_app, host='0.0.0.0', port=5000)
@@ -0,0 +1,345 @@
+"""Micro-benchmarks for the research assistant's hot paths.
+
+Usage:
+    python benchmark.py similarity [--queries 100000] [--lookups 2000]
+    python benchmark.py http [--url https://www.bing.com/] [--requests 20]
+    python benchmark.py startup [--module main] [--runs 5] [--top 15]
+    python benchmark.py parse [--fixtures DIR] [--runs 50]
+    python benchmark.py serve [--workers 1 4] [--clients 32] [--messages 20]
+"""
+import argparse
+import glob
+import html
+import itertools
+import math
+import random
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+import http_client
+import result_extractor
+from similarity import QuerySimilarityIndex
+
+WORDS = (
+    "ai machine learning climate change research latest news python integral "
+    "quantum computing energy solar battery market stock economy health vaccine "
+    "space mars rocket election policy history war europe asia africa ocean "
+    "biology genome protein language model transformer neural network robotics "
+    "chip semiconductor inflation interest rate football olympics music film"
+).split()
+
+
+def synthetic_queries(n: int, seed: int = 0, vocabulary_size: int = 20_000):
+    """Queries of 3-9 terms drawn from a Zipf-distributed vocabulary, like real query logs"""
+    rng = random.Random(seed)
+    vocabulary = WORDS + [f"term{i}" for i in range(vocabulary_size - len(WORDS))]
+    cum_weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+    return [
+        " ".join(rng.choices(vocabulary, cum_weights=cum_weights, k=rng.randint(3, 9)))
+        for _ in range(n)
+    ]
+
+
+# Question templates, so the index also holds the long posting lists of stop words
+TEMPLATES = (
+    "what is the {}", "what are the {} and {}", "how does {} work", "how do i {} with {}",
+    "who is the {} of {}", "why is the {} {}", "what is the difference between {} and {}",
+    "tell me about the {} in {}", "where is the {}", "when was the {} of the {}",
+)
+
+
+def question_queries(n: int, seed: int = 0):
+    """Stop-word-heavy questions wrapped around synthetic_queries' terms"""
+    rng = random.Random(seed)
+    terms = synthetic_queries(n, seed=seed)
+    queries = []
+    for query in terms:
+        template = rng.choice(TEMPLATES)
+        words = query.split()
+        half = max(1, len(words) // 2)
+        parts = [" ".join(words[:half]), " ".join(words[half:]) or words[0]]
+        queries.append(template.format(*parts[:template.count("{}")]))
+    return queries
+
+
+def report(name: str, samples):
+    samples = sorted(samples)
+    p99 = samples[min(len(samples) - 1, math.ceil(len(samples) * 0.99) - 1)]
+    print(f"{name}: mean {statistics.mean(samples) * 1000:.3f} ms, "
+          f"p50 {statistics.median(samples) * 1000:.3f} ms, p99 {p99 * 1000:.3f} ms")
+
+
+def bench_similarity(args):
+    for label, generate in (("keyword", synthetic_queries), ("question", question_queries)):
+        queries = generate(args.queries)
+        start = time.perf_counter()
+        index = QuerySimilarityIndex.from_queries(queries)
+        print(f"Built index over {len(index)} {label} queries in {time.perf_counter() - start:.2f} s")
+
+        samples = []
+        for query in generate(args.lookups, seed=1):
+            start = time.perf_counter()
+            index.most_similar(query)
+            samples.append(time.perf_counter() - start)
+        report(f"{label} find_similar_query lookup", samples)
+
+        samples = []
+        for query in generate(args.lookups, seed=2):
+            start = time.perf_counter()
+            index.add(query)
+            samples.append(time.perf_counter() - start)
+        report(f"{label} incremental add", samples)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = b"<html><body>stub result page</body></html>"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub_server() -> str:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}/"
+
+
+def time_to_first_byte(fetch, url: str) -> float:
+    start = time.perf_counter()
+    with fetch(url, stream=True, timeout=10) as response:
+        next(response.iter_content(1), None)
+    return time.perf_counter() - start
+
+
+def bench_http(args):
+    url = args.url or start_stub_server()
+    print(f"Fetching {url} {args.requests} times")
+    report("requests.get (new connection each time)",
+           [time_to_first_byte(requests.get, url) for _ in range(args.requests)])
+    http_client.get_session()
+    report("http_client.get (pooled keep-alive)",
+           [time_to_first_byte(http_client.get, url) for _ in range(args.requests)])
+
+
+def import_profile(module: str):
+    """Import a module in a fresh interpreter under -X importtime.
+
+    Returns the wall time of the whole process and the per-module
+    cumulative import times in seconds.
+    """
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    wall = time.perf_counter() - start
+    cumulative = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        if cumulative_us.strip().isdigit():
+            cumulative[name.strip()] = int(cumulative_us) / 1e6
+    return wall, cumulative
+
+
+def bench_startup(args):
+    walls = []
+    for _ in range(args.runs):
+        wall, cumulative = import_profile(args.module)
+        walls.append(wall)
+    report(f"cold start to 'import {args.module}' done (process wall time)", walls)
+    print(f"import {args.module}: {cumulative.get(args.module, 0) * 1000:.0f} ms cumulative (last run)")
+    top_level = {name: t for name, t in cumulative.items() if "." not in name and name != args.module}
+    print("Slowest top-level imports:")
+    for name, seconds in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+
+def synthetic_serp(engine: str, seed: int = 0, results: int = 10) -> bytes:
+    """A result page shaped like a Google or Bing SERP: bulky head, nav, results, footer"""
+    rng = random.Random(seed)
+    words = lambda n: html.escape(" ".join(rng.choices(WORDS, k=n)))
+    container = 'g' if engine == 'google' else 'b_algo'
+    parts = ['<!DOCTYPE html><html><head><meta charset="utf-8"><title>results</title>']
+    parts += [f'<style>.c{i}{{margin:{i}px;padding:{i}px}}</style>' for i in range(300)]
+    parts += [f'<script>var s{i}="{"x" * 400}";</script>' for i in range(100)]
+    parts.append('</head><body><div id="nav">')
+    parts += [f'<a href="/n{i}"><span>{words(2)}</span></a>' for i in range(80)]
+    parts.append('</div><div id="main">')
+    for i in range(results):
+        parts.append(
+            f'<div class="{container} r{i}"><div class="yuRUbf"><a href="https://example.com/{i}">'
+            f'<h3>{words(6)}</h3></a></div><div class="VwiC3b"><span>{words(30)}</span>'
+            f'<ul>{"".join(f"<li><a href=/s{j}>{words(3)}</a></li>" for j in range(4))}</ul></div></div>'
+        )
+    parts.append('</div><div id="footer">')
+    parts += [f'<p>{words(12)}</p>' for _ in range(60)]
+    parts.append('</div></body></html>')
+    return "".join(parts).encode("utf-8")
+
+
+def legacy_extract(page: bytes, limit: int = 3):
+    """The previous scrape path: decode to text, full html.parser tree, then find_all"""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(page.decode("utf-8", "replace"), "html.parser")
+    results = []
+    for node in soup.find_all("div", class_=["g", "b_algo"])[:limit]:
+        title, snippet = node.find(["h3", "h2"]), node.find(["span", "p"])
+        if title is not None and snippet is not None:
+            results.append((title.get_text(), snippet.get_text()))
+    return results
+
+
+def bench_parse(args):
+    if args.fixtures:
+        paths = sorted(glob.glob(os.path.join(args.fixtures, "*.htm*")))
+        if not paths:
+            sys.exit(f"No .html fixtures in {args.fixtures}")
+        pages = {os.path.basename(path): open(path, "rb").read() for path in paths}
+    else:
+        pages = {f"synthetic-{engine}.html": synthetic_serp(engine) for engine in ("google", "bing")}
+    for name, page in pages.items():
+        print(f"{name}: {len(page) / 1024:.0f} KiB")
+
+    extractors = [("legacy (text + full html.parser tree)", legacy_extract)]
+    extractors += [
+        (backend, lambda page, backend=backend: result_extractor.extract_results(page, backend=backend))
+        for backend in result_extractor.available_backends()
+    ]
+    expected = {name: legacy_extract(page) for name, page in pages.items()}
+    for label, extract in extractors:
+        samples = []
+        for name, page in pages.items():
+            if extract(page) != expected[name]:
+                print(f"  warning: {label} disagrees with the legacy parser on {name}")
+            for _ in range(args.runs):
+                start = time.perf_counter()
+                extract(page)
+                samples.append(time.perf_counter() - start)
+        report(f"parse per page, {label}", samples)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    sys.exit(f"Server on port {port} did not come up")
+
+
+async def chat_clients(url: str, clients: int, messages: int, message: str):
+    """Connect `clients` Socket.IO clients; each sends `messages` messages, one at a time"""
+    import asyncio
+    import socketio
+
+    async def client():
+        sio = socketio.AsyncClient()
+        answered = asyncio.Queue()
+        sio.on("ai_response", lambda data: answered.put_nowait(data))
+        await sio.connect(url, transports=["websocket"])
+        latencies = []
+        for _ in range(messages):
+            start = time.perf_counter()
+            await sio.emit("send_message", {"message": message})
+            await asyncio.wait_for(answered.get(), 60)
+            latencies.append(time.perf_counter() - start)
+        await sio.disconnect()
+        return latencies
+
+    results = await asyncio.gather(*(client() for _ in range(clients)))
+    return [latency for latencies in results for latency in latencies]
+
+
+def bench_serve(args):
+    import asyncio
+    import tempfile
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    for workers in args.workers:
+        port = free_port()
+        with tempfile.TemporaryDirectory() as tmp:
+            queue_url = f"sqlite:///{os.path.join(tmp, 'socketio_queue.db')}"
+            server = subprocess.Popen(
+                [sys.executable, "app.py", "--port", str(port), "--workers", str(workers),
+                 "--message-queue", queue_url],
+                cwd=here, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            )
+            try:
+                wait_for_port(port)
+                # One warm-up round so every worker has its imports and database connections ready
+                asyncio.run(chat_clients(f"http://127.0.0.1:{port}", workers * 2, 1, args.message))
+                start = time.perf_counter()
+                latencies = asyncio.run(chat_clients(f"http://127.0.0.1:{port}", args.clients, args.messages, args.message))
+                elapsed = time.perf_counter() - start
+            finally:
+                server.terminate()
+                server.wait()
+        print(f"{workers} worker(s): {len(latencies) / elapsed:.0f} messages/s over {args.clients} clients")
+        report(f"{workers} worker(s) round trip", latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    similarity = subparsers.add_parser("similarity", help="similar-query lookup latency")
+    similarity.add_argument("--queries", type=int, default=100_000)
+    similarity.add_argument("--lookups", type=int, default=2000)
+    similarity.set_defaults(func=bench_similarity)
+
+    http = subparsers.add_parser("http", help="time-to-first-byte with and without the pooled session")
+    http.add_argument("--url", help="defaults to a local stub server")
+    http.add_argument("--requests", type=int, default=20)
+    http.set_defaults(func=bench_http)
+
+    startup = subparsers.add_parser("startup", help="cold import time of an entry point via -X importtime")
+    startup.add_argument("--module", default="main")
+    startup.add_argument("--runs", type=int, default=5)
+    startup.add_argument("--top", type=int, default=15)
+    startup.set_defaults(func=bench_startup)
+
+    parse = subparsers.add_parser("parse", help="result extraction time per search result page")
+    parse.add_argument("--fixtures", help="directory of saved SERP .html files (default: synthetic pages)")
+    parse.add_argument("--runs", type=int, default=50)
+    parse.set_defaults(func=bench_parse)
+
+    serve = subparsers.add_parser("serve", help="chat throughput of app.py with 1..N worker processes")
+    serve.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1])
+    serve.add_argument("--clients", type=int, default=32)
+    serve.add_argument("--messages", type=int, default=20)
+    serve.add_argument("--message", default="view", help="chat message to send (default: the 'view' command, no LLM)")
+    serve.set_defaults(func=bench_serve)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Token budgets for the text that tools hand back to the agent.
+
+Every tool observation becomes part of the next LLM call, so long outputs
+cost latency and tokens on every remaining step. ContextBudget splits an
+output into passages (paragraphs, then groups of sentences), scores them
+against the query and keeps the most relevant ones, in their original
+order, until the tool's token ceiling is reached.
+"""
+import re
+import threading
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from conversation_memory import estimate_tokens
+from dedup import truncate
+
+Vectorizer = Callable[[str], Dict[int, float]]
+
+_PARAGRAPHS = re.compile(r"\n\s*\n")
+_SENTENCES = re.compile(r"(?<=[.!?])\s+")
+
+
+class ContextBudget:
+    """Per-tool token ceilings with query-aware passage selection"""
+
+    default_limits = {
+        'Enhanced_Search': 1000,
+        'Search': 800,
+        'wikipedia': 1200,
+        'Learning_Analysis': 800,
+        'View_Learning_Data': 1000,
+    }
+
+    def __init__(self, vectorize: Vectorizer, limits: Optional[Dict[str, int]] = None,
+                 default_limit: int = 1000, passage_tokens: int = 120, step_limit: Optional[int] = 2000):
+        self.vectorize = vectorize
+        self.limits = {**self.default_limits, **(limits or {})}
+        self.default_limit = default_limit
+        self.passage_tokens = passage_tokens
+        # Ceiling for all observations of one agent step together, which
+        # ParallelAgentExecutor splits across that step's tool calls
+        self.step_limit = step_limit
+        self.trimmed = Counter()
+        self.tokens_saved = Counter()
+        self._lock = threading.Lock()
+
+    def limit(self, tool: str) -> int:
+        return self.limits.get(tool, self.default_limit)
+
+    def split(self, text: str) -> List[str]:
+        """Paragraphs, with long ones broken into runs of sentences of about passage_tokens"""
+        passages = []
+        for paragraph in _PARAGRAPHS.split(text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if estimate_tokens(paragraph) <= self.passage_tokens:
+                passages.append(paragraph)
+                continue
+            current = []
+            current_tokens = 0
+            for sentence in _SENTENCES.split(paragraph):
+                tokens = estimate_tokens(sentence)
+                if current and current_tokens + tokens > self.passage_tokens:
+                    passages.append(' '.join(current))
+                    current, current_tokens = [], 0
+                current.append(sentence)
+                current_tokens += tokens
+            if current:
+                passages.append(' '.join(current))
+        return passages
+
+    def fit(self, query: str, text: str, max_tokens: int) -> str:
+        """text unchanged if it fits, else its most query-relevant passages within max_tokens"""
+        if estimate_tokens(text) <= max_tokens:
+            return text
+        passages = self.split(text)
+        query_vector = self.vectorize(query)
+
+        def score(i: int) -> float:
+            vector = self.vectorize(passages[i])
+            similarity = sum(w * vector.get(f, 0.0) for f, w in query_vector.items())
+            # Providers list their best material first; break ties towards it
+            return similarity + 0.1 * (1 - i / len(passages))
+
+        keep = []
+        budget = max_tokens
+        for i in sorted(range(len(passages)), key=score, reverse=True):
+            tokens = estimate_tokens(passages[i]) + 1
+            if tokens <= budget:
+                keep.append(i)
+                budget -= tokens
+        if not keep:
+            return truncate(text, max_tokens * 4)
+        return '\n\n'.join(passages[i] for i in sorted(keep))
+
+    def trim(self, name: str, query: str, output: str, max_tokens: int) -> str:
+        """fit(), counting the trim against name in the summary"""
+        fitted = self.fit(query, output, max_tokens)
+        if fitted is not output:
+            self._count(name, output, fitted)
+        return fitted
+
+    def budgeted(self, tool: str, func: Callable[[str], str]) -> Callable[[str], str]:
+        """Wrap a single-query tool function so its output fits the tool's ceiling"""
+        def wrapper(query: str) -> str:
+            return self.trim(tool, query, func(query), self.limit(tool))
+        return wrapper
+
+    def abudgeted(self, tool: str, func: Callable[[str], Awaitable[str]]) -> Callable[[str], Awaitable[str]]:
+        """budgeted() for coroutine tool functions"""
+        async def wrapper(query: str) -> str:
+            return self.trim(tool, query, await func(query), self.limit(tool))
+        return wrapper
+
+    def summary(self) -> str:
+        lines = [
+            f"- {tool}: limit {self.limit(tool)} tokens, {self.trimmed[tool]} outputs trimmed, "
+            f"~{self.tokens_saved[tool]} tokens saved"
+            for tool in self.limits
+        ]
+        if self.step_limit:
+            lines.append(
+                f"- Per agent step: limit {self.step_limit} tokens, {self.trimmed['agent_step']} observations "
+                f"trimmed, ~{self.tokens_saved['agent_step']} tokens saved"
+            )
+        return "\n".join(lines)
+
+    def _count(self, tool: str, output: str, fitted: str):
+        with self._lock:
+            self.trimmed[tool] += 1
+            self.tokens_saved[tool] += estimate_tokens(output) - estimate_tokens(fitted)
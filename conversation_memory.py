@@ -0,0 +1,105 @@
+"""Token-budgeted conversation memory for the agent's {chat_history} placeholder."""
+import re
+import threading
+from collections import deque
+from typing import Callable, List, Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)"""
+    return len(text) // 4 + 1
+
+
+def message_text(content) -> str:
+    """Extract visible text from a str or list-of-blocks message content"""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return ''.join(
+            block.get('text', '') if isinstance(block, dict) else str(block)
+            for block in content
+            if not isinstance(block, dict) or block.get('type', 'text') == 'text'
+        )
+    return ''
+
+
+def extractive_summary(role: str, content: str, max_chars: int = 200) -> str:
+    """Compact one turn to its first sentence"""
+    first_sentence = re.split(r'(?<=[.!?])\s', content.strip(), maxsplit=1)[0]
+    if len(first_sentence) > max_chars:
+        first_sentence = first_sentence[:max_chars].rstrip() + '...'
+    speaker = 'User' if role == 'human' else 'Assistant'
+    return f"{speaker}: {first_sentence}"
+
+
+class ConversationMemory:
+    """Recent turns verbatim plus a rolling summary of older ones.
+
+    Verbatim turns are kept within max_tokens; when a new turn pushes them
+    over, the oldest are compacted into summary lines with `summarizer`
+    (first sentence of each turn by default). The summary keeps only its
+    newest lines within summary_tokens, so the prompt size stays bounded
+    however long the conversation runs.
+    """
+
+    def __init__(self, max_tokens: int = 1500, summary_tokens: int = 300,
+                 summarizer: Optional[Callable[[str, str], str]] = None):
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer or extractive_summary
+        self.turns = deque()
+        self.turn_tokens = 0
+        self.summary = deque()
+        self.summary_size = 0
+        self.lock = threading.Lock()
+
+    def add_turn(self, role: str, content: str):
+        content = message_text(content).strip()
+        if not content:
+            return
+        with self.lock:
+            tokens = estimate_tokens(content)
+            self.turns.append((role, content, tokens))
+            self.turn_tokens += tokens
+            self._compact()
+
+    def add_exchange(self, query: str, answer):
+        self.add_turn('human', query)
+        self.add_turn('ai', answer)
+
+    def clear(self):
+        with self.lock:
+            self.turns.clear()
+            self.turn_tokens = 0
+            self.summary.clear()
+            self.summary_size = 0
+
+    def messages(self) -> List:
+        """Messages for the chat_history placeholder"""
+        # Imported here so that importing this module does not pull in langchain_core
+        from langchain_core.messages import AIMessage, HumanMessage
+        
+        with self.lock:
+            history = []
+            if self.summary:
+                history.append(HumanMessage(
+                    content="Summary of our earlier conversation:\n" + "\n".join(self.summary)
+                ))
+            for role, content, _ in self.turns:
+                history.append(HumanMessage(content=content) if role == 'human' else AIMessage(content=content))
+            return history
+
+    @property
+    def tokens(self) -> int:
+        return self.turn_tokens + self.summary_size
+
+    def _compact(self):
+        # Always keep the newest turn verbatim, even if it alone is over budget
+        while self.turn_tokens > self.max_tokens and len(self.turns) > 1:
+            role, content, tokens = self.turns.popleft()
+            self.turn_tokens -= tokens
+            line = self.summarizer(role, content)
+            self.summary.append(line)
+            self.summary_size += estimate_tokens(line)
+        while self.summary_size > self.summary_tokens and self.summary:
+            self.summary_size -= estimate_tokens(self.summary.popleft())
@@ -0,0 +1,86 @@
+"""Near-duplicate removal and a character budget for merged search results.
+
+DuckDuckGo output and scraped Google/Bing snippets often quote the same
+sentences. Each result is reduced to a set of hashed word shingles; a result
+whose shingles are mostly contained in a better-ranked result adds nothing
+and is dropped before the text reaches the agent.
+"""
+import re
+import zlib
+from typing import Dict, List, Optional, Set
+
+_WORDS = re.compile(r"\w+")
+
+
+def shingles(text: str, size: int = 3) -> Set[int]:
+    """Hashed word n-grams of text (the words themselves for very short texts)"""
+    words = _WORDS.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(word.encode('utf-8')) for word in words}
+    return {
+        zlib.crc32(' '.join(words[i:i + size]).encode('utf-8'))
+        for i in range(len(words) - size + 1)
+    }
+
+
+def containment(candidate: Set[int], kept: Set[int]) -> float:
+    """Fraction of candidate's shingles that also occur in kept"""
+    if not candidate:
+        return 1.0
+    return len(candidate & kept) / len(candidate)
+
+
+def truncate(text: str, max_chars: int) -> str:
+    """Cut text to max_chars at a word boundary, marking the cut with '...'"""
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max(max_chars - 3, 0)].rsplit(' ', 1)[0]
+    return cut.rstrip() + '...'
+
+
+class ResultDeduplicator:
+    """Select ranked results, skipping near-duplicates, within a character budget.
+
+    A result is a duplicate when at least `threshold` of its shingles occur
+    in one result already selected. max_chars caps the total 'content'
+    length handed back; the result that crosses it is truncated and the
+    rest are dropped.
+    """
+
+    def __init__(self, threshold: float = 0.7, shingle_size: int = 3, max_chars: Optional[int] = 3000,
+                 min_chars: int = 80):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.max_chars = max_chars
+        # A truncated tail shorter than this is not worth sending
+        self.min_chars = min_chars
+        self.duplicates_dropped = 0
+        self.chars_trimmed = 0
+
+    def select(self, ranked: List[Dict], limit: Optional[int] = None) -> List[Dict]:
+        """Best-first results without near-duplicates, at most `limit` of them"""
+        selected, selected_shingles = [], []
+        budget = self.max_chars
+        for result in ranked:
+            if limit is not None and len(selected) >= limit:
+                break
+            content = result.get('content', '')
+            result_shingles = shingles(content, self.shingle_size)
+            if any(containment(result_shingles, kept) >= self.threshold for kept in selected_shingles):
+                self.duplicates_dropped += 1
+                continue
+
+            if budget is not None:
+                if budget < min(self.min_chars, len(content)):
+                    self.chars_trimmed += len(content)
+                    break
+                if len(content) > budget:
+                    trimmed = truncate(content, budget)
+                    self.chars_trimmed += len(content) - len(trimmed)
+                    result = {**result, 'content': trimmed}
+                    content = trimmed
+                budget -= len(content)
+
+            selected.append(result)
+            selected_shingles.append(result_shingles)
+        return selected
@@ -0,0 +1,154 @@
+"""Shared pooled HTTP session for every outbound fetch made by the tools.
+
+A single requests.Session keeps TCP/TLS connections alive between searches,
+caps the number of sockets opened per host and retries transient failures
+with jittered exponential backoff.
+
+The asyncio serving path gets the same pooling from a shared
+httpx.AsyncClient (see get_async_client).
+"""
+import random
+import threading
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+    # gzip/deflate, plus br and zstd when the decoders are installed
+    'Accept-Encoding': ACCEPT_ENCODING,
+}
+
+
+class JitteredRetry(Retry):
+    """Retry policy whose exponential backoff is spread with full random jitter"""
+
+    def get_backoff_time(self) -> float:
+        backoff = super().get_backoff_time()
+        return random.uniform(0, backoff) if backoff else 0
+
+
+# Search result pages: connection failures are retried once against a short
+# connect timeout, but a slow or failing response is not fetched again, so
+# one scrape takes at most about its read timeout plus 2 * SCRAPE_CONNECT_TIMEOUT
+SCRAPE_CONNECT_TIMEOUT = 3.05
+
+
+def create_session(pool_connections: int = 10, pool_maxsize: int = 4, retries: int = 2,
+                   backoff_factor: float = 0.3, read_retries: Optional[int] = None,
+                   status_retries: Optional[int] = None) -> requests.Session:
+    """Build a session with keep-alive pools, per-host limits and retries.
+
+    pool_connections is the number of per-host pools kept alive and
+    pool_maxsize the number of sockets each host may hold; callers block for
+    a free connection rather than opening more than that. read_retries and
+    status_retries default to retries.
+    """
+    retry = JitteredRetry(
+        total=retries,
+        connect=retries,
+        read=retries if read_retries is None else read_retries,
+        status=retries if status_retries is None else status_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False,
+        # A 429/503 Retry-After can be minutes; the search engine circuit
+        # breakers honour it instead of blocking the request here
+        respect_retry_after_header=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=retry,
+        pool_block=True,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide pooled session, creating it on first use"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def configure(**kwargs) -> requests.Session:
+    """Replace the shared session with one built from create_session(**kwargs)"""
+    global _session
+    with _session_lock:
+        old, _session = _session, create_session(**kwargs)
+    if old is not None:
+        old.close()
+    return _session
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    """GET through the shared session"""
+    return get_session().get(url, **kwargs)
+
+
+_scrape_session = None
+
+
+def get_scrape_session() -> requests.Session:
+    """Session for search result pages: connect retries only (see SCRAPE_CONNECT_TIMEOUT)"""
+    global _scrape_session
+    if _scrape_session is None:
+        with _session_lock:
+            if _scrape_session is None:
+                _scrape_session = create_session(retries=1, read_retries=0, status_retries=0)
+    return _scrape_session
+
+
+def scrape(url: str, timeout: float = 10, **kwargs) -> requests.Response:
+    """GET a search result page within about timeout + 2 * SCRAPE_CONNECT_TIMEOUT seconds"""
+    return get_scrape_session().get(url, timeout=(SCRAPE_CONNECT_TIMEOUT, timeout), **kwargs)
+
+
+_async_client = None
+
+
+def get_async_client(max_connections: int = 100, max_keepalive: int = 20, retries: int = 2):
+    """Process-wide pooled httpx.AsyncClient for coroutine callers.
+
+    Use it from a single event loop; connections are kept alive between
+    requests and connection failures are retried.
+    """
+    global _async_client
+    if _async_client is None:
+        import httpx
+
+        _async_client = httpx.AsyncClient(
+            headers={'User-Agent': DEFAULT_HEADERS['User-Agent']},
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            transport=httpx.AsyncHTTPTransport(retries=retries),
+        )
+    return _async_client
+
+
+async def aget(url: str, **kwargs):
+    """GET through the shared async client"""
+    return await get_async_client().get(url, **kwargs)
+
+
+async def ascrape(url: str, timeout: float = 10, **kwargs):
+    """scrape() on the async client (its transport retries connection failures only)"""
+    import httpx
+
+    return await get_async_client().get(url, timeout=httpx.Timeout(timeout, connect=SCRAPE_CONNECT_TIMEOUT), **kwargs)
@@ -0,0 +1,751 @@
+"""Data access for agent_learning.db.
+
+Every read and write of the learning database goes through this module. It
+owns a thread-safe pool of SQLite connections opened in WAL mode, so the
+web UI's worker threads can read while another thread writes instead of
+failing with "database is locked". SQL lives here as module constants;
+sqlite3 keeps each connection's compiled statements in its statement
+cache, so the hot inserts are prepared once per connection.
+"""
+import atexit
+import os
+import pickle
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    # No file locks on Windows: every process applies retention itself
+    fcntl = None
+
+DB_PATH = 'agent_learning.db'
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA busy_timeout=5000',
+)
+
+SCHEMA = (
+    # Table for storing successful queries and responses
+    '''
+    CREATE TABLE IF NOT EXISTS learning_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        query TEXT,
+        response TEXT,
+        tools_used TEXT,
+        success_rating REAL,
+        timestamp TEXT
+    )
+    ''',
+    # Table for storing search results and their effectiveness
+    '''
+    CREATE TABLE IF NOT EXISTS search_effectiveness (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        search_query TEXT,
+        source_url TEXT,
+        content_snippet TEXT,
+        relevance_score REAL,
+        timestamp TEXT
+    )
+    ''',
+    # Append-only log of successful search queries
+    '''
+    CREATE TABLE IF NOT EXISTS successful_queries (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        query TEXT,
+        results_count INTEGER,
+        timestamp TEXT
+    )
+    ''',
+    # Latest reliability score per search source
+    '''
+    CREATE TABLE IF NOT EXISTS source_reliability (
+        source TEXT PRIMARY KEY,
+        score REAL
+    )
+    ''',
+    # On-disk tier of the tool result cache
+    '''
+    CREATE TABLE IF NOT EXISTS tool_cache (
+        tool TEXT,
+        query TEXT,
+        value TEXT,
+        expires_at REAL,
+        PRIMARY KEY (tool, query)
+    )
+    ''',
+)
+
+# Schema migrations applied in order on top of SCHEMA; PRAGMA user_version
+# records how many have run against a database file.
+MIGRATIONS = (
+    # 1: integer timestamps, indexes and running aggregates
+    (
+        'ALTER TABLE learning_data ADD COLUMN created_at INTEGER',
+        "UPDATE learning_data SET created_at = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)",
+        'ALTER TABLE search_effectiveness ADD COLUMN created_at INTEGER',
+        "UPDATE search_effectiveness SET created_at = CAST(strftime('%s', timestamp, 'utc') AS INTEGER)",
+        'CREATE INDEX IF NOT EXISTS idx_learning_data_created_at ON learning_data (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_search_effectiveness_created_at ON search_effectiveness (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_search_effectiveness_query ON search_effectiveness (search_query)',
+        'CREATE INDEX IF NOT EXISTS idx_tool_cache_expires_at ON tool_cache (expires_at)',
+        '''
+        CREATE TABLE IF NOT EXISTS learning_aggregates (
+            name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL,
+            scored_count INTEGER NOT NULL,
+            score_sum REAL NOT NULL
+        )
+        ''',
+        '''
+        INSERT INTO learning_aggregates (name, row_count, scored_count, score_sum)
+        SELECT 'learning_data', COUNT(*), COUNT(success_rating), TOTAL(success_rating) FROM learning_data
+        ''',
+        '''
+        INSERT INTO learning_aggregates (name, row_count, scored_count, score_sum)
+        SELECT 'search_effectiveness', COUNT(*), COUNT(relevance_score), TOTAL(relevance_score) FROM search_effectiveness
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS learning_data_aggregate AFTER INSERT ON learning_data
+        BEGIN
+            UPDATE learning_aggregates
+            SET row_count = row_count + 1,
+                scored_count = scored_count + (NEW.success_rating IS NOT NULL),
+                score_sum = score_sum + COALESCE(NEW.success_rating, 0)
+            WHERE name = 'learning_data';
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS search_effectiveness_aggregate AFTER INSERT ON search_effectiveness
+        BEGIN
+            UPDATE learning_aggregates
+            SET row_count = row_count + 1,
+                scored_count = scored_count + (NEW.relevance_score IS NOT NULL),
+                score_sum = score_sum + COALESCE(NEW.relevance_score, 0)
+            WHERE name = 'search_effectiveness';
+        END
+        ''',
+    ),
+    # 2: daily roll-up of search_effectiveness rows past the retention window
+    (
+        '''
+        CREATE TABLE IF NOT EXISTS search_effectiveness_daily (
+            day TEXT NOT NULL,
+            source_url TEXT NOT NULL,
+            row_count INTEGER NOT NULL,
+            scored_count INTEGER NOT NULL,
+            score_sum REAL NOT NULL,
+            PRIMARY KEY (day, source_url)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_successful_queries_timestamp ON successful_queries (timestamp)',
+    ),
+)
+
+INSERT_LEARNING_DATA = '''
+    INSERT INTO learning_data (query, response, tools_used, success_rating, created_at)
+    VALUES (?, ?, ?, ?, ?)
+'''
+INSERT_SEARCH_EFFECTIVENESS = '''
+    INSERT INTO search_effectiveness (search_query, source_url, content_snippet, relevance_score, created_at)
+    VALUES (?, ?, ?, ?, ?)
+'''
+INSERT_SUCCESSFUL_QUERY = 'INSERT INTO successful_queries (query, results_count, timestamp) VALUES (?, ?, ?)'
+UPSERT_SOURCE_RELIABILITY = '''
+    INSERT INTO source_reliability (source, score) VALUES (?, ?)
+    ON CONFLICT(source) DO UPDATE SET score = excluded.score
+'''
+# Moves a source's score halfway towards one observed relevance; new sources
+# start from 0.5. Done in SQL so concurrent processes never lose an update.
+BLEND_SOURCE_RELIABILITY = '''
+    INSERT INTO source_reliability (source, score) VALUES (?, (0.5 + ?) / 2)
+    ON CONFLICT(source) DO UPDATE SET score = (score + ?) / 2
+'''
+# Retention: rows up to a cutoff id are rolled up (search_effectiveness) and
+# deleted. learning_aggregates is maintained by insert triggers only, so
+# lifetime totals survive the deletes.
+ROLLUP_SEARCH_EFFECTIVENESS = '''
+    INSERT INTO search_effectiveness_daily (day, source_url, row_count, scored_count, score_sum)
+    SELECT COALESCE(date(created_at, 'unixepoch', 'localtime'), 'unknown'), COALESCE(source_url, 'Unknown'),
+           COUNT(*), COUNT(relevance_score), TOTAL(relevance_score)
+    FROM search_effectiveness WHERE id <= ?
+    GROUP BY 1, 2
+    ON CONFLICT(day, source_url) DO UPDATE SET
+        row_count = row_count + excluded.row_count,
+        scored_count = scored_count + excluded.scored_count,
+        score_sum = score_sum + excluded.score_sum
+'''
+DELETE_SEARCH_EFFECTIVENESS = 'DELETE FROM search_effectiveness WHERE id <= ?'
+DELETE_SUCCESSFUL_QUERIES = 'DELETE FROM successful_queries WHERE id <= ?'
+# Highest id past a time window, and the id just past the newest N rows
+QUERY_AGE_CUTOFF = 'SELECT MAX(id) FROM successful_queries WHERE timestamp < ?'
+QUERY_SIZE_CUTOFF = 'SELECT id FROM successful_queries ORDER BY id DESC LIMIT 1 OFFSET ?'
+SEARCH_AGE_CUTOFF = 'SELECT MAX(id) FROM search_effectiveness WHERE created_at < ?'
+SEARCH_SIZE_CUTOFF = 'SELECT id FROM search_effectiveness ORDER BY id DESC LIMIT 1 OFFSET ?'
+SELECT_CACHED_RESULT = 'SELECT expires_at, value FROM tool_cache WHERE tool = ? AND query = ? AND expires_at > ?'
+DELETE_EXPIRED_CACHE = 'DELETE FROM tool_cache WHERE expires_at <= ?'
+UPSERT_CACHED_RESULT = 'INSERT OR REPLACE INTO tool_cache (tool, query, value, expires_at) VALUES (?, ?, ?, ?)'
+
+
+class ConnectionPool:
+    """Thread-safe pool of tuned SQLite connections.
+
+    Up to max_connections connections are opened lazily; a thread borrows
+    one for the duration of a `with pool.connection()` block and blocks
+    while all of them are in use.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, max_connections: int = 8, timeout: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False, cached_statements=256)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise sqlite3.OperationalError("timed out waiting for a pooled database connection")
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection and commit on success, roll back on error"""
+        with self.connection() as conn:
+            with conn:
+                yield conn
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path: str = DB_PATH) -> ConnectionPool:
+    """Return the shared pool for db_path, creating it and the schema on first use"""
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_path)
+            if pool is None:
+                pool = ConnectionPool(db_path)
+                with pool.connection() as conn:
+                    migrate(conn)
+                _pools[db_path] = pool
+    return pool
+
+
+def connection(db_path: str = DB_PATH):
+    return get_pool(db_path).connection()
+
+
+def transaction(db_path: str = DB_PATH):
+    return get_pool(db_path).transaction()
+
+
+class BatchWriter:
+    """Write-behind queue for learning telemetry.
+
+    Callers enqueue (statement, params) pairs and return immediately; a
+    background thread groups pending rows by statement and writes them with
+    executemany in one transaction once batch_size rows are waiting or
+    flush_interval seconds have passed. flush() cuts that wait short so a
+    read can see every row submitted before it. close() drains the queue
+    and runs automatically at interpreter exit. A batch that finds the database
+    locked is retried with backoff; one that fails otherwise is written row
+    by row, so a bad row does not take the rest of the batch with it.
+    """
+
+    # Queued by flush(): write the rows batched so far without waiting out flush_interval
+    FLUSH = object()
+
+    def __init__(self, db_path: str = DB_PATH, batch_size: int = 200, flush_interval: float = 1.0,
+                 max_retries: int = 3, retry_delay: float = 0.5):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self._queue = queue.Queue()
+        self._submitted = 0
+        self._written = 0
+        self._progress = threading.Condition()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, statement: str, params: Tuple):
+        if self._closed:
+            # Late writes after shutdown go straight to disk
+            with transaction(self.db_path) as conn:
+                conn.execute(statement, params)
+            return
+        self._ensure_started()
+        with self._progress:
+            self._submitted += 1
+        self._queue.put((statement, params))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every row submitted so far has been written"""
+        with self._progress:
+            target = self._submitted
+            if self._thread is None or self._written >= target:
+                return True
+        self._queue.put(self.FLUSH)
+        with self._progress:
+            return self._progress.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self, timeout: Optional[float] = 10.0):
+        """Write everything still queued and stop the background thread"""
+        if self._thread is None or self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='learning-writer', daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = [] if item is self.FLUSH else [item]
+            deadline = time.monotonic() + self.flush_interval
+            while item is not self.FLUSH and len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is not self.FLUSH:
+                    batch.append(item)
+            if None in batch:
+                stopping = True
+                batch = [item for item in batch if item is not None]
+                # Drain whatever was queued before the stop marker
+                while True:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None and item is not self.FLUSH:
+                        batch.append(item)
+            if batch:
+                self._write(batch)
+
+    def _write(self, batch: List[Tuple[str, Tuple]]):
+        grouped: Dict[str, List[Tuple]] = {}
+        for statement, params in batch:
+            grouped.setdefault(statement, []).append(params)
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    with transaction(self.db_path) as conn:
+                        for statement, rows in grouped.items():
+                            conn.executemany(statement, rows)
+                    return
+                except sqlite3.OperationalError as e:
+                    # Another process holds the write lock past busy_timeout: wait and retry
+                    if is_busy(e):
+                        if attempt < self.max_retries:
+                            time.sleep(self.retry_delay * 2 ** attempt)
+                            continue
+                        print(f"Learning writer dropped {len(batch)} rows: {e}")
+                        return
+                    self._write_rows(batch, e)
+                    return
+                except sqlite3.Error as e:
+                    self._write_rows(batch, e)
+                    return
+        finally:
+            with self._progress:
+                self._written += len(batch)
+                self._progress.notify_all()
+
+    def _write_rows(self, batch: List[Tuple[str, Tuple]], error: sqlite3.Error):
+        # The batch failed as a whole; write it row by row so one bad row only loses itself
+        dropped = 0
+        try:
+            with transaction(self.db_path) as conn:
+                for statement, params in batch:
+                    try:
+                        conn.execute(statement, params)
+                    except sqlite3.Error as e:
+                        # SQLite rolls back just the failing statement
+                        dropped += 1
+                        print(f"Learning writer dropped a row: {e}")
+        except sqlite3.Error as e:
+            print(f"Learning writer dropped {len(batch)} rows: {error}; {e}")
+            return
+        if dropped:
+            print(f"Learning writer dropped {dropped} of {len(batch)} rows after: {error}")
+
+
+_writers: Dict[str, BatchWriter] = {}
+
+
+def get_writer(db_path: str = DB_PATH) -> BatchWriter:
+    """Return the shared write-behind queue for db_path"""
+    writer = _writers.get(db_path)
+    if writer is None:
+        with _pools_lock:
+            writer = _writers.setdefault(db_path, BatchWriter(db_path))
+    return writer
+
+
+def is_busy(error: sqlite3.OperationalError) -> bool:
+    """Whether an error means another connection holds the lock"""
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def now_timestamp() -> str:
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def migrate(conn: sqlite3.Connection):
+    """Create the learning tables and apply any pending migrations, atomically.
+
+    sqlite3 runs DDL in autocommit mode unless a transaction was opened
+    explicitly, so the whole upgrade runs under BEGIN IMMEDIATE: a crash
+    leaves the previous schema intact, and server processes starting
+    together take turns, each reading user_version only once it holds the
+    write lock.
+    """
+    with immediate_transaction(conn):
+        for statement in SCHEMA:
+            conn.execute(statement)
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, statements in enumerate(MIGRATIONS[version:], start=version + 1):
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {number}')
+
+
+@contextmanager
+def immediate_transaction(conn: sqlite3.Connection):
+    """Run the block in one BEGIN IMMEDIATE transaction, so reads in it already hold the write lock"""
+    isolation_level = conn.isolation_level
+    conn.isolation_level = None
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+    finally:
+        conn.isolation_level = isolation_level
+
+
+def init_learning_db(db_path: str = DB_PATH):
+    """Make sure the learning database exists and is up to date.
+
+    Opening the pool already does this, so calling it is only needed to
+    create the database ahead of its first use.
+    """
+    get_pool(db_path)
+
+
+def record_interaction(query: str, response: str, tools_used: str, success_rating: float):
+    """Queue one agent interaction for learning_data"""
+    get_writer().submit(INSERT_LEARNING_DATA, (query, response, tools_used, success_rating, int(time.time())))
+
+
+def record_search_results(query: str, results: Iterable[Tuple[str, str, float]]):
+    """Queue (source, snippet, relevance) rows for one search for search_effectiveness"""
+    created_at = int(time.time())
+    writer = get_writer()
+    for source, snippet, relevance in results:
+        writer.submit(INSERT_SEARCH_EFFECTIVENESS, (query, source, snippet, relevance, created_at))
+
+
+def recent_interactions(limit: int = 10) -> List[Tuple[str, str]]:
+    get_writer().flush()
+    with connection() as conn:
+        return conn.execute(
+            "SELECT query, datetime(created_at, 'unixepoch', 'localtime') FROM learning_data "
+            "ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+
+
+def successful_answers(since: int, min_success: float = 1.0, after_id: int = 0,
+                       flush: bool = True) -> List[Tuple[int, str, str, int]]:
+    """(id, query, response, created_at) of successful interactions since a Unix time, oldest first.
+
+    after_id skips rows already read, so a process can pick up answers
+    stored by other processes incrementally. flush=False reads without
+    waiting for this process's queued writes.
+    """
+    if flush:
+        get_writer().flush()
+    with connection() as conn:
+        return conn.execute(
+            "SELECT id, query, response, created_at FROM learning_data "
+            "WHERE id > ? AND created_at >= ? AND success_rating >= ? ORDER BY id", (after_id, since, min_success)
+        ).fetchall()
+
+
+def learning_stats() -> Dict[str, float]:
+    """Lifetime interaction and search totals, read from the running aggregates"""
+    get_writer().flush()
+    with connection() as conn:
+        aggregates = {
+            name: (row_count, score_sum / scored_count if scored_count else 0)
+            for name, row_count, scored_count, score_sum in conn.execute(
+                'SELECT name, row_count, scored_count, score_sum FROM learning_aggregates'
+            )
+        }
+    total_interactions, avg_success = aggregates.get('learning_data', (0, 0))
+    total_searches, avg_relevance = aggregates.get('search_effectiveness', (0, 0))
+    return {
+        'total_interactions': total_interactions,
+        'avg_success': avg_success,
+        'total_searches': total_searches,
+        'avg_relevance': avg_relevance,
+    }
+
+
+def load_cached_result(tool: str, query: str, now: float, db_path: str = DB_PATH) -> Optional[Tuple[float, str]]:
+    with connection(db_path) as conn:
+        return conn.execute(SELECT_CACHED_RESULT, (tool, query, now)).fetchone()
+
+
+def store_cached_result(tool: str, query: str, value: str, expires_at: float, now: float, db_path: str = DB_PATH):
+    with transaction(db_path) as conn:
+        conn.execute(DELETE_EXPIRED_CACHE, (now,))
+        conn.execute(UPSERT_CACHED_RESULT, (tool, query, value, expires_at))
+
+
+class LearningStore:
+    """Append-only SQLite persistence for the search engine's learning state.
+
+    Each search appends one successful_queries row and blends its relevance
+    observations into the scores of the sources it touched, so the write
+    cost does not grow with history. Writes go through the batched writer
+    and land in atomic transactions, so an interrupted write never corrupts
+    earlier state, and several server processes can share one database.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.db_path = db_path
+
+    def record_search(self, query: str, results_count: int, timestamp: str,
+                      observations: Iterable[Tuple[str, float]]):
+        """Queue a successful query and its (source, relevance) observations"""
+        writer = get_writer(self.db_path)
+        writer.submit(INSERT_SUCCESSFUL_QUERY, (query, results_count, timestamp))
+        for source, relevance in observations:
+            writer.submit(BLEND_SOURCE_RELIABILITY, (source, relevance, relevance))
+
+    def load_queries(self, limit: Optional[int] = None, after_id: int = 0, flush: bool = True) -> List[Dict]:
+        """Load successful queries oldest first, optionally only the most recent `limit`.
+
+        after_id skips rows already loaded; each dict carries its row 'id'.
+        flush=False reads without waiting for this process's queued writes.
+        """
+        if flush:
+            get_writer(self.db_path).flush()
+        with connection(self.db_path) as conn:
+            if limit is None:
+                rows = conn.execute(
+                    'SELECT id, query, timestamp, results_count FROM successful_queries WHERE id > ? ORDER BY id',
+                    (after_id,)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    'SELECT id, query, timestamp, results_count FROM successful_queries WHERE id > ? '
+                    'ORDER BY id DESC LIMIT ?',
+                    (after_id, limit)
+                ).fetchall()[::-1]
+        return [{'id': i, 'query': q, 'timestamp': t, 'results_count': c} for i, q, t, c in rows]
+
+    def load_source_reliability(self, flush: bool = True) -> Dict[str, float]:
+        if flush:
+            get_writer(self.db_path).flush()
+        with connection(self.db_path) as conn:
+            return dict(conn.execute('SELECT source, score FROM source_reliability').fetchall())
+
+    def import_pickle(self, path: str):
+        """One-time migration of a legacy search_learning.pkl into empty tables"""
+        if not os.path.exists(path):
+            return
+        with transaction(self.db_path) as conn:
+            has_queries = conn.execute('SELECT 1 FROM successful_queries LIMIT 1').fetchone()
+            has_sources = conn.execute('SELECT 1 FROM source_reliability LIMIT 1').fetchone()
+            if has_queries or has_sources:
+                return
+            with open(path, 'rb') as f:
+                legacy = pickle.load(f)
+            conn.executemany(
+                INSERT_SUCCESSFUL_QUERY,
+                [(q['query'], q.get('results_count', 0), q.get('timestamp')) for q in legacy.get('successful_queries', [])]
+            )
+            conn.executemany(UPSERT_SOURCE_RELIABILITY, legacy.get('source_reliability', {}).items())
+
+
+class LearningRetention:
+    """Rolling time and size windows for the append-only learning tables.
+
+    successful_queries keeps max_query_age_days days and at most max_queries
+    rows. search_effectiveness keeps raw rows, snippets included, for
+    raw_search_days days and at most max_search_rows rows; older rows are
+    rolled up into per-day, per-source counts and relevance sums in
+    search_effectiveness_daily. After pruning, the file is vacuumed once at
+    least vacuum_ratio of its pages are free. start() runs all of this on a
+    background thread every `interval` seconds.
+
+    Every server process calls start(), but only the one holding an
+    exclusive lock on `<db_path>.retention.lock` prunes and vacuums; the
+    others keep trying each interval and take over if that process exits.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, max_query_age_days: float = 180, max_queries: int = 20_000,
+                 raw_search_days: float = 30, max_search_rows: int = 100_000,
+                 interval: float = 6 * 60 * 60, vacuum_ratio: float = 0.25):
+        self.db_path = db_path
+        self.max_query_age_days = max_query_age_days
+        self.max_queries = max_queries
+        self.raw_search_days = raw_search_days
+        self.max_search_rows = max_search_rows
+        self.interval = interval
+        self.vacuum_ratio = vacuum_ratio
+        self.last_run: Optional[Dict[str, int]] = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._lock_file = None
+
+    def apply(self, now: Optional[float] = None) -> Dict[str, int]:
+        """Prune both tables once; returns the number of rows removed and whether the file was vacuumed"""
+        now = time.time() if now is None else now
+        query_cutoff = datetime.fromtimestamp(now - self.max_query_age_days * 86400).strftime("%Y-%m-%d %H:%M:%S")
+        search_cutoff = int(now - self.raw_search_days * 86400)
+        get_writer(self.db_path).flush()
+        # Cutoffs are read under the write lock, so no other writer can move them before the deletes
+        with connection(self.db_path) as conn, immediate_transaction(conn):
+            query_id = self._cutoff_id(conn, QUERY_AGE_CUTOFF, query_cutoff, QUERY_SIZE_CUTOFF, self.max_queries)
+            search_id = self._cutoff_id(conn, SEARCH_AGE_CUTOFF, search_cutoff, SEARCH_SIZE_CUTOFF, self.max_search_rows)
+            pruned_queries = conn.execute(DELETE_SUCCESSFUL_QUERIES, (query_id,)).rowcount if query_id else 0
+            rolled_up = 0
+            if search_id:
+                conn.execute(ROLLUP_SEARCH_EFFECTIVENESS, (search_id,))
+                rolled_up = conn.execute(DELETE_SEARCH_EFFECTIVENESS, (search_id,)).rowcount
+        vacuumed = self.vacuum() if pruned_queries or rolled_up else False
+        self.last_run = {
+            'successful_queries_pruned': pruned_queries,
+            'search_effectiveness_rolled_up': rolled_up,
+            'vacuumed': vacuumed,
+        }
+        return self.last_run
+
+    def vacuum(self, force: bool = False) -> bool:
+        """VACUUM the file if enough of its pages are free (or force is set); returns whether it ran"""
+        with connection(self.db_path) as conn:
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+            free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if not force and (not page_count or free_pages / page_count < self.vacuum_ratio):
+                return False
+            conn.execute('VACUUM')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        return True
+
+    def start(self):
+        """Apply retention now and then every interval seconds on a daemon thread"""
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='learning-retention', daemon=True)
+                    self._thread.start()
+
+    def summary(self) -> str:
+        windows = (f"- Windows: search queries {self.max_query_age_days:g} days / {self.max_queries} rows, "
+                   f"raw search results {self.raw_search_days:g} days / {self.max_search_rows} rows")
+        if self.last_run is None:
+            return windows + "\n- Not run yet in this process"
+        return windows + (
+            f"\n- Last run: {self.last_run['successful_queries_pruned']} queries pruned, "
+            f"{self.last_run['search_effectiveness_rolled_up']} search results rolled up into daily aggregates"
+            + (", database vacuumed" if self.last_run['vacuumed'] else "")
+        )
+
+    @staticmethod
+    def _cutoff_id(conn: sqlite3.Connection, age_sql: str, cutoff, size_sql: str, max_rows: int) -> int:
+        # Rows up to this id are outside the time window or beyond the newest max_rows
+        by_age = conn.execute(age_sql, (cutoff,)).fetchone()[0] or 0
+        row = conn.execute(size_sql, (max_rows,)).fetchone()
+        return max(by_age, row[0] if row else 0)
+
+    def leader(self) -> bool:
+        """Whether this process runs retention for db_path; the lock is kept until the process exits"""
+        if self._lock_file is not None or fcntl is None:
+            return True
+        lock_file = open(f"{self.db_path}.retention.lock", 'a')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                if self.leader():
+                    self.apply()
+            except Exception as e:
+                print(f"Learning retention error: {e}")
+            time.sleep(self.interval)
+
+
+_retention: Dict[str, LearningRetention] = {}
+
+
+def get_retention(db_path: str = DB_PATH) -> LearningRetention:
+    """Return the shared retention policy for db_path"""
+    retention = _retention.get(db_path)
+    if retention is None:
+        with _pools_lock:
+            retention = _retention.setdefault(db_path, LearningRetention(db_path))
+    return retention
@@ -1,21 +1,9 @@
 from dotenv import load_dotenv
 from pydantic import BaseModel
-from langchain_openai import ChatOpenAI
-from langchain_anthropic import ChatAnthropic
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import PydanticOutputParser
-from langchain.agents import create_tool_calling_agent, AgentExecutor
-from tools import (
-    search_tool, 
-    wiki_tool, 
-    save_tool, 
-    enhanced_search_tool, 
-    learning_analysis_tool,
-    learning_viewer_tool,
-    custom_search_engine
-)
-import sqlite3
-from datetime import datetime
+import learning_db
+import threading
+from conversation_memory import ConversationMemory, message_text
+from answer_cache import AnswerCache
 
 load_dotenv()
 
@@ -28,36 +16,18 @@ class ResearchResponse(BaseModel):
 
 def store_interaction_learning(query: str, response: dict, success: bool = True):
     """Store interaction data for learning"""
-    conn = sqlite3.connect('agent_learning.db')
-    cursor = conn.cursor()
-    
     tools_used = response.get('intermediate_steps', [])
     tools_list = [step[0].tool for step in tools_used if hasattr(step[0], 'tool')]
     
-    cursor.execute('''
-        INSERT INTO learning_data 
-        (query, response, tools_used, success_rating, timestamp)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (
+    learning_db.record_interaction(
         query,
-        str(response.get('output', '')),
+        message_text(response.get('output', '')),
         ','.join(tools_list),
-        1.0 if success else 0.0,
-        datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    ))
-    
-    conn.commit()
-    conn.close()
-
-llm = ChatAnthropic(model="claude-sonnet-4-20250514")
-parser = PydanticOutputParser(pydantic_object=ResearchResponse)
+        1.0 if success else 0.0
+    )
 
 # Enhanced prompt with learning context
-prompt = ChatPromptTemplate.from_messages(
-    [
-        (
-            "system",
-            """
+SYSTEM_PROMPT = """
             You are an advanced research assistant with learning capabilities.
             
             You have access to:
@@ -73,32 +43,89 @@ prompt = ChatPromptTemplate.from_messages(
             
             Answer the user query and use necessary tools.
             Wrap the output in this format and provide no other text \n{format_instructions}
-            """,
-        ),
-        ("placeholder", "{chat_history}"),
-        ("human", "{query}"),
-        ("placeholder", "{agent_scratchpad}"),
-    ]
-).partial(format_instructions=parser.get_format_instructions())
+            """
 
-# Include all tools, prioritizing enhanced ones
-tools = [enhanced_search_tool, wiki_tool, save_tool, learning_analysis_tool, learning_viewer_tool, search_tool]
+_agent = None
+_agent_lock = threading.Lock()
 
-agent = create_tool_calling_agent(
-    llm=llm,
-    prompt=prompt,
-    tools=tools
-)
+def get_agent():
+    """Return (agent_executor, parser), building them on first use.
+    
+    langchain, the Anthropic client and the search tools take seconds to
+    import, so they load here - normally on the warm-up thread while the
+    user types - instead of before the first prompt is shown.
+    """
+    global _agent
+    if _agent is None:
+        with _agent_lock:
+            if _agent is None:
+                from langchain_anthropic import ChatAnthropic
+                from langchain_core.prompts import ChatPromptTemplate
+                from langchain_core.output_parsers import PydanticOutputParser
+                from langchain.agents import create_tool_calling_agent
+                from parallel_agent import ParallelAgentExecutor
+                from tools import (
+                    search_tool, 
+                    wiki_tool, 
+                    save_tool, 
+                    enhanced_search_tool, 
+                    learning_analysis_tool,
+                    learning_viewer_tool,
+                    context_budget
+                )
+                
+                llm = ChatAnthropic(model="claude-sonnet-4-20250514")
+                parser = PydanticOutputParser(pydantic_object=ResearchResponse)
+                
+                prompt = ChatPromptTemplate.from_messages(
+                    [
+                        ("system", SYSTEM_PROMPT),
+                        ("placeholder", "{chat_history}"),
+                        ("human", "{query}"),
+                        ("placeholder", "{agent_scratchpad}"),
+                    ]
+                ).partial(format_instructions=parser.get_format_instructions())
+                
+                # Include all tools, prioritizing enhanced ones
+                tools = [enhanced_search_tool, wiki_tool, save_tool, learning_analysis_tool, learning_viewer_tool, search_tool]
+                
+                agent = create_tool_calling_agent(
+                    llm=llm,
+                    prompt=prompt,
+                    tools=tools
+                )
+                
+                _agent = (ParallelAgentExecutor(agent=agent, tools=tools, verbose=True,
+                                                context_budget=context_budget), parser)
+    return _agent
+
+def warm_up_in_background():
+    """Load the agent and search clients while the user types the first query"""
+    def load():
+        try:
+            from tools import warm_up
+            
+            get_agent()
+            warm_up()
+        except Exception as e:
+            print(f"Warm-up error: {e}")
+    threading.Thread(target=load, name='warm-up', daemon=True).start()
 
-agent_executor = AgentExecutor(agent=agent, tools=tools, verbose=True)
+# Conversation memory for this CLI session, fed to the {chat_history} placeholder
+memory = ConversationMemory()
+
+# Recent answers to similar questions are served without running the agent
+answer_cache = AnswerCache()
 
 def main():
     print("🤖 Enhanced AI Research Assistant with Learning Capabilities")
     print("Available commands:")
     print("- 'analyze' to see learning insights")
     print("- 'view' to see all learning data")
+    print("- 'refresh <question>' to research again instead of using a cached answer")
     print("- 'exit' to quit")
     print("-" * 50)
+    warm_up_in_background()
     
     while True:
         query = input("\nWhat do you want to research? ")
@@ -106,20 +133,38 @@ def main():
         if query.lower() == 'exit':
             break
         elif query.lower() == 'analyze':
-            analysis = learning_analysis_tool.func()
+            from tools import analyze_learning_data
+            analysis = analyze_learning_data()
             print(analysis)
+            print(answer_cache.summary())
             continue
         elif query.lower() == 'view':
-            learning_data = learning_viewer_tool.func()
+            from tools import view_learning_data
+            learning_data = view_learning_data()
             print(learning_data)
             continue
         
+        refresh = query.lower().startswith('refresh ')
+        if refresh:
+            query = query[len('refresh '):]
+            answer_cache.invalidate(query)
+        
         try:
-            print("\n🔍 Researching...")
-            raw_response = agent_executor.invoke({"query": query})
-            
-            # Store the interaction for learning
-            store_interaction_learning(query, raw_response, True)
+            cached = None if refresh else answer_cache.lookup(query)
+            if cached:
+                print(f"\n⚡ Answered from cache: similar to \"{cached.query}\" "
+                      f"(similarity {cached.score:.2f}, {cached.age / 60:.0f} min old)")
+                raw_response = {"query": query, "output": cached.response}
+                agent_executor, parser = get_agent()
+            else:
+                print("\n🔍 Researching...")
+                agent_executor, parser = get_agent()
+                raw_response = agent_executor.invoke({"query": query, "chat_history": memory.messages()})
+                
+                # Store the interaction for learning
+                store_interaction_learning(query, raw_response, True)
+                answer_cache.add(query, message_text(raw_response.get("output", "")))
+            memory.add_exchange(query, message_text(raw_response.get("output", "")))
             
             print("\n" + "="*50)
             print("RAW RESPONSE:")
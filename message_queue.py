@@ -0,0 +1,97 @@
+"""Socket.IO message queue adapters for running the web UI in several processes.
+
+With more than one server process, an event emitted by one worker has to
+reach a client whose connection lives in another. python-socketio solves
+this with a pub/sub client manager: every emit is handled locally and also
+published on a channel that all workers listen to.
+
+Redis (redis://), Kafka (kafka://), ZeroMQ (zmq+tcp://) and AMQP URLs go
+to the managers shipped with python-socketio. sqlite:///path.db selects
+SQLiteQueueManager, a stand-in broker on a shared SQLite file that needs no
+extra service, for running and testing several workers on one machine.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import socketio
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS socketio_messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        channel TEXT NOT NULL,
+        payload BLOB NOT NULL,
+        created_at REAL NOT NULL
+    )
+'''
+
+
+class SQLiteQueueManager(socketio.PubSubManager):
+    """Pub/sub client manager on a shared SQLite table.
+
+    Publishing appends a row; every worker polls for rows newer than the
+    last one it has seen, so each message reaches every listener. Rows older
+    than `retention` seconds are deleted by the publishers.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, url: str = 'sqlite:///socketio_queue.db', channel: str = 'socketio', write_only: bool = False,
+                 logger=None, json=None, poll_interval: float = 0.02, retention: float = 60.0):
+        self.db_path = url[len('sqlite:///'):] if url.startswith('sqlite:///') else url
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._conn = None
+        self._lock = threading.Lock()
+        self._published = 0
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Called with the lock held
+        if self._conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            conn.execute(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _publish(self, data):
+        payload = pickle.dumps(data)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                'INSERT INTO socketio_messages (channel, payload, created_at) VALUES (?, ?, ?)',
+                (self.channel, payload, now)
+            )
+            self._published += 1
+            if self._published % 500 == 0:
+                conn.execute('DELETE FROM socketio_messages WHERE created_at < ?', (now - self.retention,))
+
+    def _listen(self):
+        # The listener gets its own connection so polling never waits on publishers
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(SCHEMA)
+        # Only messages published after this worker started are delivered
+        last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM socketio_messages').fetchone()[0]
+        while True:
+            rows = conn.execute(
+                'SELECT id, payload FROM socketio_messages WHERE id > ? AND channel = ? ORDER BY id',
+                (last_id, self.channel)
+            ).fetchall()
+            for row_id, payload in rows:
+                last_id = row_id
+                yield pickle.loads(payload)
+            if not rows:
+                time.sleep(self.poll_interval)
+
+
+def client_manager(url: Optional[str], channel: str = 'flask-socketio', write_only: bool = False):
+    """Client manager for a queue URL, or None to let Flask-SocketIO build its own for the URL"""
+    if url and url.startswith('sqlite:'):
+        return SQLiteQueueManager(url, channel=channel, write_only=write_only)
+    return None
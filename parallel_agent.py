@@ -0,0 +1,105 @@
+"""AgentExecutor that runs the tool calls of one agent step concurrently.
+
+A tool-calling model can ask for several tools in one turn (for example
+Enhanced_Search and wikipedia). The stock executor runs them one after the
+other; ParallelAgentExecutor dispatches them to a thread pool and hands the
+observations back in the order the model asked for them, so a multi-tool
+step takes about as long as its slowest tool.
+
+With a context_budget, the observations of one step also share its
+step_limit: each of the step's N tool calls keeps at most step_limit / N
+tokens, so parallel calls cannot add up to an oversized next LLM call.
+"""
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Iterator, Optional
+
+from langchain.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentStep
+
+# Pool of the agent step currently being executed in this context, if any
+_step_pool: contextvars.ContextVar = contextvars.ContextVar('agent_step_pool', default=None)
+
+
+class ParallelAgentExecutor(AgentExecutor):
+    """Drop-in AgentExecutor; max_parallel_tools=1 restores sequential tool calls"""
+
+    max_parallel_tools: int = 4
+    # context_budget.ContextBudget whose step_limit caps each step's observations
+    context_budget: Optional[Any] = None
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps,
+                        run_manager=None) -> Iterator:
+        # The base implementation yields all of a step's AgentActions before its first AgentStep
+        actions = 0
+        for item in self._iter_parallel_step(
+            name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+        ):
+            if isinstance(item, AgentAction):
+                actions += 1
+            yield self._fit_step(item, actions)
+
+    async def _aiter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps,
+                               run_manager=None) -> AsyncIterator:
+        # The async base implementation already runs a step's tools concurrently
+        actions = 0
+        async for item in super()._aiter_next_step(
+            name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+        ):
+            if isinstance(item, AgentAction):
+                actions += 1
+            yield self._fit_step(item, actions)
+
+    def _fit_step(self, item, actions: int):
+        """Trim an observation to its share of the step's token ceiling"""
+        budget = self.context_budget
+        if budget is None or not budget.step_limit or not isinstance(item, AgentStep):
+            return item
+        if not isinstance(item.observation, str):
+            return item
+        share = budget.step_limit // max(actions, 1)
+        observation = budget.trim('agent_step', str(item.action.tool_input), item.observation, share)
+        if observation is item.observation:
+            return item
+        return AgentStep(action=item.action, observation=observation)
+
+    def _iter_parallel_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps,
+                            run_manager=None) -> Iterator:
+        if self.max_parallel_tools <= 1:
+            yield from super()._iter_next_step(
+                name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+            )
+            return
+
+        # The base implementation yields every AgentAction and then calls
+        # _perform_agent_action once per action; while the pool is set those
+        # calls return futures, so all tools of the step start before any
+        # observation is awaited.
+        with ThreadPoolExecutor(max_workers=self.max_parallel_tools, thread_name_prefix='agent-tool') as pool:
+            token = _step_pool.set(pool)
+            pending = []
+            try:
+                for item in super()._iter_next_step(
+                    name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager
+                ):
+                    if isinstance(item, Future):
+                        pending.append(item)
+                    else:
+                        yield item
+            finally:
+                _step_pool.reset(token)
+
+            for future in pending:
+                yield future.result()
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action,
+                              run_manager: Optional[object] = None):
+        pool = _step_pool.get()
+        if pool is None:
+            return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        # Run in a copy of the caller's context so tracing/callback context carries over
+        perform = super()._perform_agent_action
+        return pool.submit(
+            contextvars.copy_context().run,
+            perform, name_to_tool_map, color_mapping, agent_action, run_manager
+        )
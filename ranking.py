@@ -0,0 +1,118 @@
+"""Vectorized ranking of search results.
+
+RankingEngine scores every candidate in one NumPy pass from four signals:
+- the relevance reported by the provider
+- the learned reliability of its source
+- query-snippet cosine similarity over hashed term vectors
+- recency, for results that carry a timestamp
+
+Only the top-k candidates are sorted, after an argpartition. rank_batch()
+ranks the candidate lists of many queries at once.
+"""
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+Vectorizer = Callable[[str], Dict[int, float]]
+
+
+class RankingEngine:
+    """Weighted multi-signal scorer with partial top-k selection"""
+
+    default_weights = {
+        'relevance': 0.35,
+        'reliability': 0.35,
+        'similarity': 0.2,
+        'recency': 0.1,
+    }
+
+    def __init__(self, vectorize: Vectorizer, weights: Optional[Dict[str, float]] = None,
+                 default_reliability: float = 0.5, recency_half_life: float = 7 * 24 * 3600):
+        self.vectorize = vectorize
+        self.weights = {**self.default_weights, **(weights or {})}
+        self.default_reliability = default_reliability
+        self.recency_half_life = recency_half_life
+
+    def score(self, queries: Sequence[str], results: Sequence[Dict], groups: np.ndarray,
+              reliability: Mapping[str, float], now: Optional[float] = None) -> np.ndarray:
+        """Combined score of each result against the query of its group"""
+        n = len(results)
+        relevance = np.fromiter((r.get('relevance', 0.5) for r in results), dtype=np.float64, count=n)
+        source_reliability = np.fromiter(
+            (reliability.get(r.get('source', 'Unknown'), self.default_reliability) for r in results),
+            dtype=np.float64, count=n
+        )
+        similarity = self.similarity(queries, [r.get('content', '') for r in results], groups)
+
+        # Results without a timestamp are neither boosted nor penalised
+        now = time.time() if now is None else now
+        timestamps = np.fromiter((r.get('timestamp') or np.nan for r in results), dtype=np.float64, count=n)
+        recency = np.where(
+            np.isnan(timestamps), 0.5,
+            np.exp2(-np.maximum(now - np.nan_to_num(timestamps), 0) / self.recency_half_life)
+        )
+
+        w = self.weights
+        return (w['relevance'] * relevance + w['reliability'] * source_reliability
+                + w['similarity'] * similarity + w['recency'] * recency) / sum(w.values())
+
+    def similarity(self, queries: Sequence[str], texts: Sequence[str], groups: np.ndarray) -> np.ndarray:
+        """Cosine similarity of each text with its group's query, as one sparse dot product"""
+        query_vectors = [self.vectorize(query) for query in queries]
+        rows, features, weights = [], [], []
+        for row, text in enumerate(texts):
+            vector = self.vectorize(text)
+            rows.extend([row] * len(vector))
+            features.extend(vector.keys())
+            weights.extend(vector.values())
+
+        # Key every (query, feature) pair so one sorted lookup serves the whole batch
+        q_keys, q_weights = [], []
+        for group, vector in enumerate(query_vectors):
+            q_keys.extend(group * (1 << 32) + feature for feature in vector)
+            q_weights.extend(vector.values())
+        if not rows or not q_keys:
+            return np.zeros(len(texts))
+        q_keys = np.array(q_keys, dtype=np.int64)
+        order = np.argsort(q_keys)
+        q_keys, q_weights = q_keys[order], np.array(q_weights, dtype=np.float64)[order]
+
+        rows = np.array(rows, dtype=np.int64)
+        keys = groups[rows] * (1 << 32) + np.array(features, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(q_keys, keys), len(q_keys) - 1)
+        products = np.where(q_keys[positions] == keys, np.array(weights) * q_weights[positions], 0.0)
+        return np.bincount(rows, weights=products, minlength=len(texts))
+
+    def rank(self, query: str, results: List[Dict], reliability: Mapping[str, float],
+             top_k: Optional[int] = None, now: Optional[float] = None) -> List[Dict]:
+        """Score results in place ('relevance') and return the top_k, best first"""
+        return self.rank_batch([query], [results], reliability, top_k, now)[0]
+
+    def rank_batch(self, queries: Sequence[str], result_lists: Sequence[List[Dict]],
+                   reliability: Mapping[str, float], top_k: Optional[int] = None,
+                   now: Optional[float] = None) -> List[List[Dict]]:
+        """Rank the candidate lists of many queries in one pass"""
+        results = [result for result_list in result_lists for result in result_list]
+        if not results:
+            return [[] for _ in result_lists]
+        sizes = np.fromiter((len(r) for r in result_lists), dtype=np.int64, count=len(result_lists))
+        groups = np.repeat(np.arange(len(result_lists)), sizes)
+        scores = self.score(queries, results, groups, reliability, now)
+        for result, score in zip(results, scores.tolist()):
+            result['relevance'] = score
+
+        starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        ranked = []
+        for start, size in zip(starts.tolist(), sizes.tolist()):
+            group_scores = scores[start:start + size]
+            k = size if top_k is None else min(top_k, size)
+            if k < size:
+                # Partial sort: only the k winners are ordered
+                top = np.argpartition(-group_scores, k - 1)[:k]
+            else:
+                top = np.arange(size)
+            # Best first; ties keep the candidates' original order
+            top = top[np.lexsort((top, -group_scores[top]))]
+            ranked.append([results[start + i] for i in top.tolist()])
+        return ranked
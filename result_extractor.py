@@ -0,0 +1,127 @@
+"""Pluggable extraction of result titles and snippets from search-engine pages.
+
+Pages are passed in as the raw response bytes and decoded at most once. The
+fastest installed backend is used: selectolax, then lxml, then BeautifulSoup
+with html.parser. The BeautifulSoup backend uses a SoupStrainer so that only
+the result containers are built into a tree. Every backend stops after
+`limit` result containers.
+"""
+import importlib.util
+import re
+from itertools import islice
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+# Result containers: div.g on Google, div.b_algo on Bing
+RESULT_CLASSES = ('g', 'b_algo')
+
+Result = Tuple[str, str]
+
+_CHARSET = re.compile(r'charset=["\']?([\w.:-]+)', re.I)
+
+
+def charset_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Charset declared in a Content-Type header, or None to let the parser sniff <meta>"""
+    match = _CHARSET.search(content_type or '')
+    return match.group(1) if match else None
+
+
+def _decode(page: Union[bytes, str], encoding: Optional[str]) -> Union[bytes, str]:
+    if isinstance(page, bytes) and encoding:
+        try:
+            return page.decode(encoding, 'replace')
+        except LookupError:
+            pass
+    return page
+
+
+def extract_selectolax(page: Union[bytes, str], limit: int, encoding: Optional[str] = None) -> List[Result]:
+    from selectolax.parser import HTMLParser
+
+    tree = HTMLParser(_decode(page, encoding))
+    selector = ', '.join(f'div.{name}' for name in RESULT_CLASSES)
+    results = []
+    for node in islice(tree.css(selector), limit):
+        title = node.css_first('h3, h2')
+        snippet = node.css_first('span, p')
+        if title is not None and snippet is not None:
+            results.append((title.text(), snippet.text()))
+    return results
+
+
+def extract_lxml(page: Union[bytes, str], limit: int, encoding: Optional[str] = None) -> List[Result]:
+    import lxml.html
+
+    if isinstance(page, bytes):
+        # lxml decodes the bytes itself, from the header charset or the page's <meta>
+        parser = lxml.html.HTMLParser(encoding=encoding) if encoding else None
+        try:
+            tree = lxml.html.document_fromstring(page, parser=parser)
+        except LookupError:
+            tree = lxml.html.document_fromstring(page)
+    else:
+        tree = lxml.html.document_fromstring(page)
+    results = []
+    containers = (
+        node for node in tree.iter('div')
+        if _has_result_class(node.get('class'))
+    )
+    for node in islice(containers, limit):
+        title = node.xpath('(.//h3 | .//h2)[1]')
+        snippet = node.xpath('(.//span | .//p)[1]')
+        if title and snippet:
+            results.append((title[0].text_content(), snippet[0].text_content()))
+    return results
+
+
+def _has_result_class(value) -> bool:
+    tokens = value.split() if isinstance(value, str) else (value or ())
+    return not set(RESULT_CLASSES).isdisjoint(tokens)
+
+
+def extract_soup(page: Union[bytes, str], limit: int, encoding: Optional[str] = None) -> List[Result]:
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    # While parsing, the strainer sees the raw class attribute ("g tF2Cxc"), so match its tokens
+    only_results = SoupStrainer('div', class_=_has_result_class)
+    soup = BeautifulSoup(page, 'html.parser', parse_only=only_results,
+                         from_encoding=encoding if isinstance(page, bytes) else None)
+    results = []
+    for node in soup.find_all('div', class_=list(RESULT_CLASSES), limit=limit):
+        title = node.find(['h3', 'h2'])
+        snippet = node.find(['span', 'p'])
+        if title is not None and snippet is not None:
+            results.append((title.get_text(), snippet.get_text()))
+    return results
+
+
+# Backends in order of preference, with the module each one needs
+BACKENDS: Dict[str, Tuple[str, Callable[..., List[Result]]]] = {
+    'selectolax': ('selectolax', extract_selectolax),
+    'lxml': ('lxml', extract_lxml),
+    'html.parser': ('bs4', extract_soup),
+}
+
+
+def available_backends() -> List[str]:
+    return [name for name, (module, _) in BACKENDS.items() if importlib.util.find_spec(module)]
+
+
+def extract_results(page: Union[bytes, str], limit: int = 3, encoding: Optional[str] = None,
+                    backend: Optional[str] = None) -> List[Result]:
+    """(title, snippet) pairs from the first `limit` result containers on a page"""
+    if backend is None:
+        backend = default_backend()
+    return BACKENDS[backend][1](page, limit, encoding)
+
+
+_default_backend = None
+
+
+def default_backend() -> str:
+    global _default_backend
+    if _default_backend is None:
+        available = available_backends()
+        if not available:
+            raise ImportError("No HTML parser available; install lxml, selectolax or beautifulsoup4")
+        _default_backend = available[0]
+    return _default_backend
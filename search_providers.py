@@ -0,0 +1,458 @@
+"""Shared registry of search-provider clients.
+
+Each provider is built once from its factory on first use and then reused by
+every tool and thread. Calls made through the registry are timed so that the
+health and latency of each provider can be reported, and identical calls
+already in flight are coalesced with SingleFlight.
+
+Every provider, including the scraped search engines, also has a guard: a
+token-bucket rate limit plus a circuit breaker that stops calling a provider
+for a cooldown once it starts rate limiting, serving CAPTCHAs, failing or
+answering too slowly.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class SingleFlight:
+    """Collapse concurrent calls that share a key into one execution.
+
+    The first caller for a key runs the function; callers arriving while it
+    is still in flight wait for it and receive the same result, or the same
+    exception.
+    """
+
+    class Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.calls: Dict[Hashable, "SingleFlight.Call"] = {}
+        self.lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return (result, shared); shared is True when another caller did the work"""
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = self.Call()
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result, False
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines running on one event loop"""
+
+    def __init__(self):
+        self.calls: Dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, func: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Await func() once per key; returns (result, shared) like SingleFlight.do"""
+        task = self.calls.get(key)
+        shared = task is not None
+        if not shared:
+            task = self.calls[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: self.calls.pop(key, None))
+        # Shielded so one cancelled waiter does not cancel the call for the others
+        return await asyncio.shield(task), shared
+
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling a provider whose circuit is open or whose rate limit is spent"""
+
+
+class TokenBucket:
+    """Allow `rate` calls per second on average, in bursts of up to `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, max_wait: float = 0.0) -> Optional[float]:
+        """Reserve a token; returns how long to wait before using it, or None if over max_wait"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = (1 - self.tokens) / self.rate if self.tokens < 1 else 0.0
+            if wait > max_wait:
+                return None
+            # Reserve the token now so concurrent callers queue up behind it
+            self.tokens -= 1
+            return wait
+
+    def acquire(self, max_wait: float = 0.0) -> bool:
+        """Take a token, sleeping up to max_wait for one; False if it would take longer"""
+        wait = self.reserve(max_wait)
+        if wait:
+            time.sleep(wait)
+        return wait is not None
+
+
+class CircuitBreaker:
+    """Closed -> open after repeated failures -> half-open trial after a cooldown.
+
+    While open every call is refused. After the cooldown one trial call is
+    let through: success closes the circuit, failure re-opens it with the
+    cooldown doubled (up to max_cooldown). Failures that show the provider
+    is actively refusing us (429, CAPTCHA) open it immediately.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown: float = 60.0,
+                 max_cooldown: float = 15 * 60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = 'closed'
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial_in_flight = False
+        self.reason = None
+        self.trips = 0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == 'closed':
+                return True
+            if time.monotonic() < self.open_until or self.trial_in_flight:
+                return False
+            self.state = 'half-open'
+            self.trial_in_flight = True
+            return True
+
+    def release(self):
+        """Let the next call be the trial when the admitted one never reported an outcome"""
+        with self.lock:
+            self.trial_in_flight = False
+
+    def success(self):
+        with self.lock:
+            self.state = 'closed'
+            self.failures = 0
+            self.trial_in_flight = False
+            self.cooldown = self.base_cooldown
+
+    def failure(self, reason: str, trip: bool = False, retry_after: Optional[float] = None):
+        with self.lock:
+            self.failures += 1
+            self.reason = reason
+            if self.state == 'half-open':
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            elif not trip and self.failures < self.failure_threshold:
+                return
+            cooldown = max(self.cooldown, retry_after or 0)
+            self.state = 'open'
+            self.open_until = time.monotonic() + cooldown
+            self.trial_in_flight = False
+            self.trips += 1
+        print(f"Circuit opened for {self.name} for {cooldown:.0f}s: {reason}")
+
+    def as_dict(self) -> Dict:
+        with self.lock:
+            return {
+                'state': self.state,
+                'reason': self.reason,
+                'trips': self.trips,
+                'retry_in_s': round(max(0.0, self.open_until - time.monotonic()), 1) if self.state == 'open' else 0,
+            }
+
+
+class ProviderGuard:
+    """Rate limit and circuit breaker in front of one provider.
+
+    check() raises ProviderUnavailable when the provider must be skipped;
+    callers then report the outcome with success() or failure(). A call
+    slower than slow_after seconds counts as a failure.
+    """
+
+    def __init__(self, name: str, rate: float = 1.0, burst: int = 5, max_wait: float = 1.0,
+                 slow_after: float = 8.0, **breaker_options):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.breaker = CircuitBreaker(name, **breaker_options)
+        self.max_wait = max_wait
+        self.slow_after = slow_after
+        self.skipped = 0
+
+    def check(self):
+        wait = self._admit()
+        if wait:
+            try:
+                time.sleep(wait)
+            except BaseException:
+                self.breaker.release()
+                raise
+
+    async def acheck(self):
+        """check() for coroutines: waits for a rate-limit token without blocking the loop"""
+        wait = self._admit()
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except BaseException:
+                # Cancelled while waiting: the call never ran
+                self.breaker.release()
+                raise
+
+    def _admit(self) -> float:
+        if not self.breaker.allow():
+            self.skipped += 1
+            raise ProviderUnavailable(f"{self.name} circuit open: {self.breaker.reason}")
+        wait = self.bucket.reserve(self.max_wait)
+        if wait is None:
+            self.skipped += 1
+            # A trial call that never ran must not leave the breaker half-open forever
+            self.breaker.release()
+            raise ProviderUnavailable(f"{self.name} rate limit reached")
+        return wait
+
+    def success(self, seconds: float):
+        if seconds > self.slow_after:
+            self.breaker.failure(f"slow response ({seconds:.1f}s)")
+        else:
+            self.breaker.success()
+
+    def failure(self, reason: str, trip: bool = False, retry_after: Optional[float] = None):
+        self.breaker.failure(reason, trip=trip, retry_after=retry_after)
+
+    def cancelled(self, seconds: float):
+        """A call cancelled (e.g. by a search deadline) before it reported an outcome"""
+        if seconds > self.slow_after:
+            self.breaker.failure(f"cancelled after {seconds:.1f}s")
+        else:
+            self.breaker.release()
+
+    def as_dict(self) -> Dict:
+        return {**self.breaker.as_dict(), 'skipped': self.skipped}
+
+
+class ProviderStats:
+    """Call counts, failures and latency for one provider"""
+
+    def __init__(self, unhealthy_after: int = 3):
+        self.unhealthy_after = unhealthy_after
+        self.calls = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.last_error = None
+
+    def record(self, seconds: float, error: Optional[BaseException] = None):
+        self.calls += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        if error is None:
+            self.consecutive_failures = 0
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+
+    @property
+    def healthy(self) -> bool:
+        return self.consecutive_failures < self.unhealthy_after
+
+    def as_dict(self) -> Dict:
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'healthy': self.healthy,
+            'mean_ms': round(self.total_seconds / self.calls * 1000, 1) if self.calls else None,
+            'max_ms': round(self.max_seconds * 1000, 1),
+            'last_error': self.last_error,
+        }
+
+
+class ProviderRegistry:
+    """Thread-safe, lazily populated map of provider name -> client.
+
+    register() only records a factory; the client is created the first time
+    get() or run() asks for it and is shared from then on.
+    """
+
+    def __init__(self):
+        self.factories: Dict[str, Callable[[], Any]] = {}
+        self.providers: Dict[str, Any] = {}
+        self.stats: Dict[str, ProviderStats] = {}
+        self.guards: Dict[str, ProviderGuard] = {}
+        self.flights = SingleFlight()
+        self.async_flights = AsyncSingleFlight()
+        self.lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        with self.lock:
+            self.factories[name] = factory
+            self.providers.pop(name, None)
+            self.stats.setdefault(name, ProviderStats())
+
+    def get(self, name: str) -> Any:
+        provider = self.providers.get(name)
+        if provider is None:
+            with self.lock:
+                provider = self.providers.get(name)
+                if provider is None:
+                    if name not in self.factories:
+                        raise KeyError(f"Unknown search provider: {name}")
+                    provider = self.providers[name] = self.factories[name]()
+        return provider
+
+    def configure_guard(self, name: str, **options) -> ProviderGuard:
+        """Set the rate limit / circuit breaker options (see ProviderGuard) for a provider"""
+        with self.lock:
+            guard = self.guards[name] = ProviderGuard(name, **options)
+        return guard
+
+    def guard(self, name: str) -> ProviderGuard:
+        guard = self.guards.get(name)
+        if guard is None:
+            with self.lock:
+                guard = self.guards.setdefault(name, ProviderGuard(name))
+        return guard
+
+    def run(self, name: str, query: str) -> str:
+        """Run a query through the named provider, recording latency and failures.
+
+        Identical queries already in flight on the same provider (e.g. the
+        Search tool and Enhanced_Search asking DuckDuckGo at once) share
+        one call.
+        """
+        result, _ = self.flights.do((name, query), lambda: self._run(name, query))
+        return result
+
+    def _run(self, name: str, query: str) -> str:
+        provider = self.get(name)
+        guard = self.guard(name)
+        guard.check()
+        start = time.perf_counter()
+        try:
+            result = provider.run(query)
+        except Exception as e:
+            self._outcome(name, guard, time.perf_counter() - start, e)
+            raise
+        except BaseException:
+            guard.cancelled(time.perf_counter() - start)
+            raise
+        self._outcome(name, guard, time.perf_counter() - start)
+        return result
+
+    async def arun(self, name: str, query: str) -> str:
+        """run() for coroutines.
+
+        The DuckDuckGo and Wikipedia clients only have blocking APIs, so the
+        call itself runs in the loop's default thread pool; rate limiting,
+        coalescing and the circuit breaker never block the loop.
+        """
+        result, _ = await self.async_flights.do((name, query), lambda: self._arun(name, query))
+        return result
+
+    async def _arun(self, name: str, query: str) -> str:
+        provider = self.get(name)
+        guard = self.guard(name)
+        await guard.acheck()
+        start = time.perf_counter()
+        try:
+            result = await asyncio.to_thread(provider.run, query)
+        except Exception as e:
+            self._outcome(name, guard, time.perf_counter() - start, e)
+            raise
+        except BaseException:
+            guard.cancelled(time.perf_counter() - start)
+            raise
+        self._outcome(name, guard, time.perf_counter() - start)
+        return result
+
+    def _outcome(self, name: str, guard: ProviderGuard, seconds: float, error: Optional[BaseException] = None):
+        self.record(name, seconds, error)
+        if error is None:
+            guard.success(seconds)
+        else:
+            # duckduckgo_search raises RatelimitException when it is throttled
+            guard.failure(f"{type(error).__name__}: {error}", trip='ratelimit' in type(error).__name__.lower())
+
+    def record(self, name: str, seconds: float, error: Optional[BaseException] = None):
+        with self.lock:
+            self.stats.setdefault(name, ProviderStats()).record(seconds, error)
+
+    def healthy(self, name: str) -> bool:
+        with self.lock:
+            stats = self.stats.get(name)
+            return stats is None or stats.healthy
+
+    def warm_up(self):
+        """Create every registered provider ahead of the first query"""
+        for name in list(self.factories):
+            self.get(name)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self.lock:
+            stats = {name: stats.as_dict() for name, stats in self.stats.items()}
+            guards = dict(self.guards)
+        for name, guard in guards.items():
+            circuit = guard.as_dict()
+            entry = stats.setdefault(name, ProviderStats().as_dict())
+            entry['circuit'] = circuit
+            entry['healthy'] = entry['healthy'] and circuit['state'] == 'closed'
+        return stats
+
+    def summary(self) -> str:
+        lines = []
+        for name, stats in self.snapshot().items():
+            status = 'healthy' if stats['healthy'] else 'unhealthy'
+            mean = f"{stats['mean_ms']:.0f} ms" if stats['mean_ms'] is not None else 'n/a'
+            line = f"- {name}: {status}, {stats['calls']} calls, {stats['failures']} failures, mean {mean}"
+            circuit = stats.get('circuit')
+            if circuit and circuit['state'] != 'closed':
+                line += f", circuit {circuit['state']} ({circuit['reason']})"
+            if circuit and circuit['skipped']:
+                line += f", {circuit['skipped']} skipped"
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def _duckduckgo():
+    from langchain_community.tools import DuckDuckGoSearchRun
+    return DuckDuckGoSearchRun()
+
+
+def _wikipedia():
+    from langchain_community.utilities import WikipediaAPIWrapper
+    # Fetch generously; the tool's token budget keeps only the passages the query needs
+    return WikipediaAPIWrapper(top_k_results=2, doc_content_chars_max=8000)
+
+
+# Process-wide registry used by the search and Wikipedia tools
+registry = ProviderRegistry()
+registry.register('duckduckgo', _duckduckgo)
+registry.register('wikipedia', _wikipedia)
+registry.configure_guard('duckduckgo', rate=1.0, burst=5)
+registry.configure_guard('wikipedia', rate=5.0, burst=10)
+# Scraped result pages throttle and CAPTCHA aggressively
+registry.configure_guard('Google', rate=0.5, burst=3, slow_after=5.0)
+registry.configure_guard('Bing', rate=0.5, burst=3, slow_after=5.0)
@@ -0,0 +1,153 @@
+"""Cosine similarity between short texts over hashed term vectors."""
+import math
+import re
+import threading
+import zlib
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+class QuerySimilarityIndex:
+    """Incremental cosine-similarity index over hashed query term vectors.
+
+    Terms are mapped to features with the hashing trick (CRC32 modulo
+    n_features, L2-normalised counts), so no vocabulary has to be fitted.
+    The sparse query matrix is stored column-wise as posting lists: adding
+    a query appends one entry per distinct term, and a lookup only touches
+    the rows that share a term with the incoming query.
+
+    Lookups score by TF-IDF cosine: idf comes from the posting list
+    lengths at lookup time, so it follows the index as it grows. Candidates
+    are gathered from the query's rarest terms first, up to scan_ratio of
+    the index's rows (at least min_scan); the long posting lists of terms
+    like "what", "is" and "the" are left out once that budget is spent,
+    since their low idf barely moves a score. The best `candidates` rows
+    by that estimate are then rescored exactly. A query whose terms match
+    a stored query's exactly is found directly, so a repeat always scores 1.
+
+    With max_queries set, the index keeps only the newest queries: once it
+    holds a quarter more than max_queries it is rebuilt from the newest
+    max_queries, so memory stays bounded at an amortised constant cost per add.
+    """
+
+    token_pattern = re.compile(r"(?u)\b\w\w+\b")
+
+    # Posting entries a lookup may always scan, whatever scan_ratio says
+    min_scan = 2000
+
+    def __init__(self, n_features: int = 2 ** 18, max_queries: Optional[int] = None,
+                 scan_ratio: float = 0.05, candidates: int = 8):
+        self.n_features = n_features
+        self.max_queries = max_queries
+        self.scan_ratio = scan_ratio
+        self.candidates = candidates
+        self.queries: List[str] = []
+        self._postings: Dict[int, Tuple[array, array]] = {}
+        # Space-joined terms -> newest row with exactly those terms
+        self._exact: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_queries(cls, queries: Iterable[str], **kwargs) -> "QuerySimilarityIndex":
+        index = cls(**kwargs)
+        for query in queries:
+            index.add(query)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.queries)
+
+    def terms(self, text: str) -> List[str]:
+        return self.token_pattern.findall(text.lower())
+
+    def counts(self, text: str) -> Counter:
+        """Hashed term counts of text"""
+        return Counter(zlib.crc32(token.encode('utf-8')) % self.n_features for token in self.terms(text))
+
+    def vectorize(self, text: str) -> Dict[int, float]:
+        """Hash text into an L2-normalised {feature: weight} vector"""
+        counts = self.counts(text)
+        if not counts:
+            return {}
+        norm = sum(c * c for c in counts.values()) ** 0.5
+        return {feature: c / norm for feature, c in counts.items()}
+
+    def add(self, query: str):
+        """Append a query as a new row of the index"""
+        vector = self.vectorize(query)
+        with self._lock:
+            self._append(query, vector)
+            if self.max_queries and len(self.queries) > self.max_queries + max(self.max_queries // 4, 1):
+                self._compact()
+
+    def _append(self, query: str, vector: Dict[int, float]):
+        row = len(self.queries)
+        self.queries.append(query)
+        self._exact[' '.join(self.terms(query))] = row
+        for feature, weight in vector.items():
+            rows, weights = self._postings.setdefault(feature, (array('q'), array('d')))
+            rows.append(row)
+            weights.append(weight)
+
+    def _compact(self):
+        # Called with the lock held: rebuild from the newest max_queries queries
+        kept = self.queries[-self.max_queries:]
+        self.queries = []
+        self._postings = {}
+        self._exact = {}
+        for query in kept:
+            self._append(query, self.vectorize(query))
+
+    def most_similar(self, query: str) -> Tuple[Optional[str], float]:
+        """Return the stored query with the highest TF-IDF cosine similarity and its score"""
+        counts = self.counts(query)
+        key = ' '.join(self.terms(query))
+        with self._lock:
+            row = self._exact.get(key)
+            if row is not None:
+                return self.queries[row], 1.0
+            present = [f for f in counts if f in self._postings]
+            if not present:
+                return None, 0.0
+            query_vector = self._tfidf(counts)
+            budget = max(self.scan_ratio * len(self.queries), self.min_scan)
+            selective, scanned = [], 0
+            for f in sorted(present, key=lambda f: len(self._postings[f][0])):
+                df = len(self._postings[f][0])
+                # The rarest term is always scanned, even if it alone exceeds the budget
+                if selective and scanned + df > budget:
+                    break
+                selective.append(f)
+                scanned += df
+            rows = np.concatenate([np.frombuffer(self._postings[f][0], dtype=np.int64) for f in selective])
+            weights = np.concatenate([
+                np.frombuffer(self._postings[f][1]) * (query_vector[f] * self._idf(f)) for f in selective
+            ])
+            # Sum per distinct row; sorting the matched rows is cheaper than a bincount over the whole index
+            matched, inverse = np.unique(rows, return_inverse=True)
+            estimates = np.bincount(inverse, weights=weights)
+            if len(matched) > self.candidates:
+                matched = matched[np.argpartition(estimates, -self.candidates)[-self.candidates:]]
+            best, best_score = None, 0.0
+            for row in matched:
+                vector = self._tfidf(self.counts(self.queries[row]))
+                score = sum(weight * vector.get(f, 0.0) for f, weight in query_vector.items())
+                if score > best_score or (score == best_score and best is not None and row < best):
+                    best, best_score = int(row), score
+            if best is None:
+                return None, 0.0
+            return self.queries[best], min(best_score, 1.0)
+
+    def _idf(self, feature: int) -> float:
+        # Smoothed idf, as scikit-learn's TfidfVectorizer computes it; called with the lock held
+        postings = self._postings.get(feature)
+        df = len(postings[0]) if postings else 0
+        return math.log((1 + len(self.queries)) / (1 + df)) + 1
+
+    def _tfidf(self, counts: Counter) -> Dict[int, float]:
+        weighted = {f: c * self._idf(f) for f, c in counts.items()}
+        norm = sum(w * w for w in weighted.values()) ** 0.5
+        return {f: w / norm for f, w in weighted.items()} if norm else {}
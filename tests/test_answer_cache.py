@@ -0,0 +1,28 @@
+import learning_db
+from answer_cache import AnswerCache
+
+FRANCE = "what is the population and the capital city of france in the year two thousand twenty"
+SPAIN = "what is the population and the capital city of spain in the year two thousand twenty"
+
+
+def make_cache(monkeypatch):
+    monkeypatch.setattr(learning_db, 'successful_answers', lambda *args, **kwargs: [])
+    cache = AnswerCache()
+    cache.add(FRANCE, "Paris; about 67 million people.")
+    return cache
+
+
+def test_different_entity_is_not_served(monkeypatch):
+    cache = make_cache(monkeypatch)
+    best, score = cache._index.most_similar(SPAIN)
+    assert best == FRANCE and score >= cache.threshold
+    assert cache.lookup(SPAIN) is None
+    assert cache.misses == 1
+
+
+def test_same_question_is_served(monkeypatch):
+    cache = make_cache(monkeypatch)
+    cached = cache.lookup("What's the population and the capital city of France in the year two thousand twenty?")
+    assert cached is not None
+    assert cached.query == FRANCE
+    assert cached.response.startswith("Paris")
@@ -1,74 +1,257 @@
-from langchain_community.tools import WikipediaQueryRun, DuckDuckGoSearchRun
-from langchain_community.utilities import WikipediaAPIWrapper
-from langchain.tools import Tool
+from langchain_core.tools import Tool
 from datetime import datetime
-import requests
-from bs4 import BeautifulSoup
+import http_client
+import learning_db
+import result_extractor
+from ranking import RankingEngine
+from similarity import QuerySimilarityIndex
+from dedup import ResultDeduplicator
+from context_budget import ContextBudget
+from learning_db import LearningStore
+from search_providers import AsyncSingleFlight, ProviderUnavailable, SingleFlight, registry
+import asyncio
 import sqlite3
-import json
-import pickle
-import os
-from typing import List, Dict
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-
-# Initialize learning database
-def init_learning_db():
-    conn = sqlite3.connect('agent_learning.db')
-    cursor = conn.cursor()
-    
-    # Table for storing successful queries and responses
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS learning_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            query TEXT,
-            response TEXT,
-            tools_used TEXT,
-            success_rating REAL,
-            timestamp TEXT
-        )
-    ''')
-    
-    # Table for storing search results and their effectiveness
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS search_effectiveness (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            search_query TEXT,
-            source_url TEXT,
-            content_snippet TEXT,
-            relevance_score REAL,
-            timestamp TEXT
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
-
-# Initialize the database
-init_learning_db()
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import quote_plus
+from typing import Awaitable, Callable, List, Dict, Optional
+
+# HTML parsers and the search clients (see result_extractor and search_providers)
+# are imported on first use so that importing this module stays fast.
+
+
+class ResultCache:
+    """Size-bounded LRU cache of tool outputs with per-tool TTLs.
+
+    Entries are keyed on (tool name, normalized query). When db_path is set,
+    every entry is also written to the tool_cache table so the cache
+    survives restarts; memory misses fall through to that tier. Concurrent
+    misses for the same key are coalesced into a single tool call.
+    """
+
+    default_ttls = {
+        'Enhanced_Search': 15 * 60,
+        'Search': 15 * 60,
+        'wikipedia': 24 * 60 * 60,
+    }
+
+    def __init__(self, max_entries: int = 512, ttls: Optional[Dict[str, float]] = None,
+                 db_path: Optional[str] = 'agent_learning.db'):
+        self.max_entries = max_entries
+        self.ttls = {**self.default_ttls, **(ttls or {})}
+        self.db_path = db_path
+        self.hits = Counter()
+        self.misses = Counter()
+        self.coalesced = Counter()
+        self.flights = SingleFlight()
+        self.async_flights = AsyncSingleFlight()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Case-, whitespace- and punctuation-insensitive cache key"""
+        return ' '.join(re.findall(r"\w+", query.lower()))
+
+    def get(self, tool: str, query: str) -> Optional[str]:
+        key = (tool, self.normalize(query))
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits[tool] += 1
+                    return entry[1]
+                del self._entries[key]
+        
+        entry = self._load(key, now)
+        with self._lock:
+            if entry is None:
+                self.misses[tool] += 1
+                return None
+            self.hits[tool] += 1
+            self._remember(key, entry)
+        return entry[1]
+
+    def set(self, tool: str, query: str, value: str):
+        key = (tool, self.normalize(query))
+        entry = (time.time() + self.ttls.get(tool, 15 * 60), value)
+        with self._lock:
+            self._remember(key, entry)
+        self._store(key, entry)
+
+    def cached(self, tool: str, func: Callable[[str], str],
+               cacheable: Callable[[str], bool] = bool) -> Callable[[str], str]:
+        """Wrap a single-query tool function with this cache"""
+        def fill(query: str) -> str:
+            value = func(query)
+            if cacheable(value):
+                self.set(tool, query, value)
+            return value
+        
+        def wrapper(query: str) -> str:
+            value = self.get(tool, query)
+            if value is None:
+                value, shared = self.flights.do((tool, self.normalize(query)), lambda: fill(query))
+                if shared:
+                    with self._lock:
+                        self.coalesced[tool] += 1
+            return value
+        return wrapper
+
+    def acached(self, tool: str, func: Callable[[str], Awaitable[str]],
+                cacheable: Callable[[str], bool] = bool) -> Callable[[str], Awaitable[str]]:
+        """cached() for coroutine tool functions"""
+        async def fill(query: str) -> str:
+            value = await func(query)
+            if cacheable(value):
+                await asyncio.to_thread(self.set, tool, query, value)
+            return value
+        
+        async def wrapper(query: str) -> str:
+            # The SQLite tier is a blocking read, so it runs off the event loop
+            value = await asyncio.to_thread(self.get, tool, query)
+            if value is None:
+                value, shared = await self.async_flights.do((tool, self.normalize(query)), lambda: fill(query))
+                if shared:
+                    with self._lock:
+                        self.coalesced[tool] += 1
+            return value
+        return wrapper
+    
+    def summary(self) -> str:
+        lines = []
+        for tool in self.ttls:
+            hits, misses = self.hits[tool], self.misses[tool]
+            rate = hits / (hits + misses) if hits + misses else 0
+            lines.append(f"- {tool} Cache: {hits} hits, {misses} misses ({rate:.0%} hit rate), "
+                         f"{self.coalesced[tool]} coalesced")
+        return "\n".join(lines)
+
+    def _remember(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _load(self, key, now: float):
+        if not self.db_path:
+            return None
+        try:
+            return learning_db.load_cached_result(*key, now, db_path=self.db_path)
+        except sqlite3.Error:
+            return None
+
+    def _store(self, key, entry):
+        if not self.db_path:
+            return
+        try:
+            learning_db.store_cached_result(*key, entry[1], entry[0], time.time(), db_path=self.db_path)
+        except sqlite3.Error as e:
+            print(f"Result cache write error: {e}")
+
 
 class CustomSearchEngine:
-    def __init__(self):
+    # Result pages scraped by custom_web_search, in order of preference
+    search_engines = [
+        ('Google', "https://www.google.com/search?q={query}&num={num_results}"),
+        ('Bing', "https://www.bing.com/search?q={query}&count={num_results}"),
+    ]
+    
+    def __init__(self, fan_out: bool = True, search_deadline: float = 12.0, max_workers: int = 8,
+                 html_backend: Optional[str] = None, max_result_chars: Optional[int] = 3000,
+                 sync_interval: float = 5.0):
+        self.fan_out = fan_out
+        # None picks the fastest installed parser (see result_extractor)
+        self.html_backend = html_backend
+        self.search_deadline = search_deadline
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='search')
         self.learning_file = "search_learning.pkl"
-        self.load_learning_data()
+        self.store = LearningStore()
+        self.store.import_pickle(self.learning_file)
+        # Old rows are pruned from the store in the background; memory keeps the same window
+        self.retention = learning_db.get_retention(self.store.db_path)
+        self.retention.start()
+        self.max_resident_queries = self.retention.max_queries
+        self._learning_data = None
+        self._similarity_index = None
+        # The store is shared with other server processes; their queries and
+        # source scores are pulled in every sync_interval seconds
+        self.sync_interval = sync_interval
+        self._last_query_id = 0
+        self._synced_at = 0.0
+        # Queries learned here whose rows have not been read back yet
+        self._unsynced = Counter()
+        # Scores snippets with the same hashed term vectors as the similarity index
+        self.ranker = RankingEngine(QuerySimilarityIndex().vectorize)
+        self.deduplicator = ResultDeduplicator(max_chars=max_result_chars)
+        self._load_lock = threading.Lock()
+    
+    @property
+    def learning_data(self) -> Dict:
+        """Learning state, loaded from the store on first access and kept in sync with it"""
+        if self._learning_data is None:
+            self.load_learning_data()
+        elif time.monotonic() - self._synced_at > self.sync_interval:
+            self.sync_learning_data()
+        return self._learning_data
+    
+    @property
+    def similarity_index(self) -> QuerySimilarityIndex:
+        """Similarity index over successful queries, built on first access"""
+        if self._similarity_index is None:
+            queries = self.learning_data['successful_queries']
+            with self._load_lock:
+                if self._similarity_index is None:
+                    self._similarity_index = QuerySimilarityIndex.from_queries(
+                        (q['query'] for q in queries), max_queries=self.max_resident_queries
+                    )
+        return self._similarity_index
     
     def load_learning_data(self):
         """Load previous learning data"""
-        if os.path.exists(self.learning_file):
-            with open(self.learning_file, 'rb') as f:
-                self.learning_data = pickle.load(f)
-        else:
-            self.learning_data = {
-                'successful_queries': [],
-                'query_patterns': {},
-                'source_reliability': {}
-            }
+        with self._load_lock:
+            if self._learning_data is None:
+                queries = self.store.load_queries(limit=self.max_resident_queries)
+                self._learning_data = {
+                    'successful_queries': queries,
+                    'query_patterns': {},
+                    'source_reliability': self.store.load_source_reliability()
+                }
+                self._last_query_id = queries[-1]['id'] if queries else 0
+                self._synced_at = time.monotonic()
+    
+    def sync_learning_data(self):
+        """Add queries and source scores stored since the last load, including other processes' writes"""
+        self._synced_at = time.monotonic()
+        # No flush: this process's pending rows are already in memory
+        new_queries = self.store.load_queries(after_id=self._last_query_id, flush=False)
+        source_reliability = self.store.load_source_reliability(flush=False)
+        with self._load_lock:
+            for entry in new_queries:
+                if entry['id'] <= self._last_query_id:
+                    continue
+                self._last_query_id = entry['id']
+                if self._unsynced[entry['query']]:
+                    self._unsynced[entry['query']] -= 1
+                    if not self._unsynced[entry['query']]:
+                        del self._unsynced[entry['query']]
+                    continue
+                self.remember_query(entry)
+                if self._similarity_index is not None:
+                    self._similarity_index.add(entry['query'])
+            self._learning_data['source_reliability'] = source_reliability
     
-    def save_learning_data(self):
-        """Save learning data to file"""
-        with open(self.learning_file, 'wb') as f:
-            pickle.dump(self.learning_data, f)
+    def remember_query(self, entry: Dict):
+        """Append to the resident successful queries, dropping the oldest beyond the retention window"""
+        queries = self._learning_data['successful_queries']
+        queries.append(entry)
+        if len(queries) > self.max_resident_queries + self.max_resident_queries // 4:
+            del queries[:-self.max_resident_queries]
     
     def enhanced_search(self, query: str, num_results: int = 5) -> str:
         """Enhanced search with learning capabilities"""
@@ -79,156 +262,317 @@ class CustomSearchEngine:
                 print(f"Found similar successful query: {similar_query}")
             
             # Perform multiple search strategies
-            results = []
+            if self.fan_out:
+                results = self.fan_out_search(query, num_results)
+            else:
+                results = []
+                
+                # Strategy 1: DuckDuckGo search
+                ddg_results = self.duckduckgo_search(query, num_results)
+                results.extend(ddg_results)
+                
+                # Strategy 2: Custom web scraping
+                custom_results = self.custom_web_search(query, num_results)
+                results.extend(custom_results)
             
-            # Strategy 1: DuckDuckGo search
-            ddg_results = self.duckduckgo_search(query, num_results)
-            results.extend(ddg_results)
+            return self.finish_search(query, results, num_results)
             
-            # Strategy 2: Custom web scraping
-            custom_results = self.custom_web_search(query, num_results)
-            results.extend(custom_results)
-            
-            # Rank and filter results based on learning
-            ranked_results = self.rank_results(query, results)
-            
-            # Learn from this search
-            self.learn_from_search(query, ranked_results)
+        except Exception as e:
+            return f"Search error: {str(e)}"
+    
+    async def aenhanced_search(self, query: str, num_results: int = 5) -> str:
+        """enhanced_search for coroutines; fetches with asyncio instead of worker threads.
+        
+        The similarity lookup and finish_search touch the learning database
+        (and may wait on its lock or a flush), so they run in worker threads.
+        """
+        try:
+            similar_query = await asyncio.to_thread(self.find_similar_query, query)
+            if similar_query:
+                print(f"Found similar successful query: {similar_query}")
             
-            # Format results
-            formatted_results = self.format_search_results(ranked_results[:num_results])
+            if self.fan_out:
+                results = await self.afan_out_search(query, num_results)
+            else:
+                results = await self.aduckduckgo_search(query, num_results)
+                results += await self.acustom_web_search(query, num_results)
             
-            return formatted_results
+            return await asyncio.to_thread(self.finish_search, query, results, num_results)
             
         except Exception as e:
             return f"Search error: {str(e)}"
     
+    def finish_search(self, query: str, results: List[Dict], num_results: int) -> str:
+        """Rank, learn from, deduplicate and format the merged results of one search"""
+        # Rank and filter results based on learning; every candidate gets a score.
+        # Keep some headroom for the near-duplicates dropped below.
+        ranked_results = self.rank_results(query, results, top_k=2 * num_results)
+        
+        # Learn from this search
+        self.learn_from_search(query, results)
+        
+        # Drop overlapping snippets and cap the text sent back to the agent
+        selected_results = self.deduplicator.select(ranked_results, limit=num_results)
+        
+        # Format results
+        return self.format_search_results(selected_results)
+    
     def find_similar_query(self, query: str) -> str:
-        """Find similar successful queries using TF-IDF similarity"""
-        if not self.learning_data['successful_queries']:
+        """Find similar successful queries using the incremental similarity index"""
+        if not len(self.similarity_index):
             return None
         
         try:
-            queries = [q['query'] for q in self.learning_data['successful_queries']]
-            queries.append(query)
-            
-            vectorizer = TfidfVectorizer()
-            tfidf_matrix = vectorizer.fit_transform(queries)
-            
-            similarity_scores = cosine_similarity(tfidf_matrix[-1:], tfidf_matrix[:-1])
-            best_match_idx = np.argmax(similarity_scores)
-            
-            if similarity_scores[0][best_match_idx] > 0.7:  # Threshold for similarity
-                return queries[best_match_idx]
+            best_match, score = self.similarity_index.most_similar(query)
+            if score > 0.7:  # Threshold for similarity
+                return best_match
         except:
             pass
         
         return None
     
     def duckduckgo_search(self, query: str, num_results: int) -> List[Dict]:
-        """Enhanced DuckDuckGo search"""
-        search = DuckDuckGoSearchRun()
+        """Enhanced DuckDuckGo search through the shared provider client"""
         try:
-            results = search.run(query)
-            return [{'content': results, 'source': 'DuckDuckGo', 'relevance': 0.8}]
-        except:
+            return self.split_passages(registry.run('duckduckgo', query))
+        except Exception:
+            # Failures and skips are recorded by the provider's guard
             return []
     
-    def custom_web_search(self, query: str, num_results: int) -> List[Dict]:
-        """Custom web search using multiple sources"""
-        results = []
+    async def aduckduckgo_search(self, query: str, num_results: int) -> List[Dict]:
+        try:
+            return self.split_passages(await registry.arun('duckduckgo', query))
+        except Exception:
+            return []
+    
+    @staticmethod
+    def split_passages(output: str) -> List[Dict]:
+        """One result per passage of DuckDuckGo's text, so ranking and dedup can drop the weak or repeated ones"""
+        return [
+            # learn_from_search folds the passages back into one result
+            {'content': passage, 'source': 'DuckDuckGo', 'relevance': 0.8, 'passage_of': 'DuckDuckGo'}
+            for passage in context_budget.split(output)
+        ]
+    
+    def fan_out_search(self, query: str, num_results: int, deadline: Optional[float] = None) -> List[Dict]:
+        """Query DuckDuckGo and every search engine at once, keeping what arrives before the deadline"""
+        deadline = self.search_deadline if deadline is None else deadline
+        futures = [self.executor.submit(self.duckduckgo_search, query, num_results)]
+        futures += [
+            self.executor.submit(self.scrape_search_engine, url, query, num_results, min(10, deadline), engine)
+            for engine, url in self.search_engines
+        ]
+        
+        done, pending = wait(futures, timeout=deadline)
+        for future in pending:
+            future.cancel()
         
-        # Search engines to try
-        search_urls = [
-            f"https://www.google.com/search?q={query.replace(' ', '+')}&num={num_results}",
-            f"https://www.bing.com/search?q={query.replace(' ', '+')}&count={num_results}",
+        # Merge in strategy order so the output does not depend on arrival order
+        results = []
+        for future in futures:
+            if future in done and future.exception() is None:
+                results.extend(future.result())
+        return results
+    
+    async def afan_out_search(self, query: str, num_results: int, deadline: Optional[float] = None) -> List[Dict]:
+        """fan_out_search on the event loop: one task per strategy, no threads"""
+        deadline = self.search_deadline if deadline is None else deadline
+        tasks = [asyncio.ensure_future(self.aduckduckgo_search(query, num_results))]
+        tasks += [
+            asyncio.ensure_future(self.ascrape_search_engine(url, query, num_results, min(10, deadline), engine))
+            for engine, url in self.search_engines
         ]
         
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        
+        results = []
+        for task in tasks:
+            if task in done and task.exception() is None:
+                results.extend(task.result())
+        return results
+    
+    def scrape_search_engine(self, url_template: str, query: str, num_results: int, timeout: float = 10,
+                             engine: Optional[str] = None) -> List[Dict]:
+        """Scrape the top results from one search engine result page.
+        
+        When engine is given the call goes through that engine's rate limit and
+        circuit breaker; ProviderUnavailable is raised if it is being skipped.
+        """
+        guard = registry.guard(engine) if engine else None
+        if guard:
+            guard.check()
+        url = url_template.format(query=quote_plus(query), num_results=num_results)
+        
+        start = time.perf_counter()
+        try:
+            response = http_client.scrape(url, timeout=timeout)
+        except Exception as e:
+            if guard:
+                registry.record(engine, time.perf_counter() - start, e)
+                guard.failure(f"{type(e).__name__}: {e}")
+            raise
+        
+        return self.parse_result_page(response, engine, guard, start)
+    
+    async def ascrape_search_engine(self, url_template: str, query: str, num_results: int, timeout: float = 10,
+                                    engine: Optional[str] = None) -> List[Dict]:
+        """scrape_search_engine over the shared async HTTP client"""
+        guard = registry.guard(engine) if engine else None
+        if guard:
+            await guard.acheck()
+        url = url_template.format(query=quote_plus(query), num_results=num_results)
+        
+        start = time.perf_counter()
+        try:
+            response = await http_client.ascrape(url, timeout=timeout)
+        except Exception as e:
+            if guard:
+                registry.record(engine, time.perf_counter() - start, e)
+                guard.failure(f"{type(e).__name__}: {e}")
+            raise
+        except BaseException:
+            # Cancelled by the fan-out deadline: don't leave a half-open trial in flight
+            if guard:
+                guard.cancelled(time.perf_counter() - start)
+            raise
+        
+        return self.parse_result_page(response, engine, guard, start)
+    
+    def parse_result_page(self, response, engine: Optional[str], guard, start: float) -> List[Dict]:
+        """Extract results from a requests or httpx response and report the outcome to the guard"""
+        results = []
+        if response.status_code == 200:
+            # Parse the raw bytes so the page is decoded once, by the parser
+            for title, snippet in result_extractor.extract_results(
+                response.content,
+                limit=3,
+                encoding=result_extractor.charset_from_content_type(response.headers.get('Content-Type')),
+                backend=self.html_backend,
+            ):
+                results.append({
+                    'content': f"{title}: {snippet}",
+                    'source': 'Custom Search',
+                    'relevance': 0.7
+                })
         
-        for url in search_urls:
+        if guard:
+            registry.record(engine, time.perf_counter() - start)
+            blocked = None if results else self.blocked_reason(response)
+            if blocked:
+                guard.failure(blocked, trip=True, retry_after=self.retry_after(response))
+            elif response.status_code != 200:
+                guard.failure(f"HTTP {response.status_code}")
+            else:
+                guard.success(time.perf_counter() - start)
+        
+        return results
+    
+    @staticmethod
+    def blocked_reason(response) -> Optional[str]:
+        """Why a result page shows we are being throttled (429, CAPTCHA), or None"""
+        if response.status_code == 429:
+            return "HTTP 429 Too Many Requests"
+        # Google redirects throttled clients to /sorry/; both engines serve a CAPTCHA page
+        if '/sorry/' in str(response.url):
+            return "CAPTCHA (redirected to /sorry/)"
+        body = response.content[:200_000].lower()
+        if b'captcha' in body or b'unusual traffic' in body:
+            return f"CAPTCHA page (HTTP {response.status_code})"
+        return None
+    
+    @staticmethod
+    def retry_after(response) -> Optional[float]:
+        value = response.headers.get('Retry-After', '')
+        return float(value) if value.isdigit() else None
+    
+    def custom_web_search(self, query: str, num_results: int) -> List[Dict]:
+        """Custom web search using multiple sources"""
+        for engine, url in self.search_engines:
             try:
-                response = requests.get(url, headers=headers, timeout=10)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    # Extract search results (simplified)
-                    search_results = soup.find_all('div', class_=['g', 'b_algo'])[:3]
-                    
-                    for result in search_results:
-                        try:
-                            title = result.find(['h3', 'h2']).get_text()
-                            snippet = result.find(['span', 'p']).get_text()
-                            
-                            results.append({
-                                'content': f"{title}: {snippet}",
-                                'source': 'Custom Search',
-                                'relevance': 0.7
-                            })
-                        except:
-                            continue
-                break  # Use first successful search engine
-            except:
+                # Use the first engine that is not being skipped and does not fail
+                return self.scrape_search_engine(url, query, num_results, engine=engine)
+            except Exception:
+                # The reason is recorded by the engine's guard (see registry.snapshot())
                 continue
         
-        return results
+        return []
     
-    def rank_results(self, query: str, results: List[Dict]) -> List[Dict]:
-        """Rank results based on learning data"""
-        for result in results:
-            # Base relevance from source reliability
-            source_reliability = self.learning_data['source_reliability'].get(
-                result.get('source', 'Unknown'), 0.5
-            )
-            
-            # Combine with existing relevance
-            result['relevance'] = (result.get('relevance', 0.5) + source_reliability) / 2
+    async def acustom_web_search(self, query: str, num_results: int) -> List[Dict]:
+        for engine, url in self.search_engines:
+            try:
+                return await self.ascrape_search_engine(url, query, num_results, engine=engine)
+            except Exception:
+                continue
         
-        # Sort by relevance
-        return sorted(results, key=lambda x: x.get('relevance', 0), reverse=True)
+        return []
+    
+    def rank_results(self, query: str, results: List[Dict], top_k: Optional[int] = None) -> List[Dict]:
+        """Score results against learned source reliability and the query; return the top_k, best first"""
+        return self.ranker.rank(query, results, self.learning_data['source_reliability'], top_k)
+    
+    def rank_results_batch(self, queries: List[str], result_lists: List[List[Dict]],
+                           top_k: Optional[int] = None) -> List[List[Dict]]:
+        """rank_results for many queries' candidate lists in one vectorized pass"""
+        return self.ranker.rank_batch(queries, result_lists, self.learning_data['source_reliability'], top_k)
+    
+    @staticmethod
+    def merge_passages(results: List[Dict]) -> List[Dict]:
+        """Fold passages split from one provider result back into that result, at their mean relevance"""
+        merged = OrderedDict()
+        for i, result in enumerate(results):
+            merged.setdefault(result.get('passage_of', i), []).append(result)
+        combined = []
+        for parts in merged.values():
+            if len(parts) == 1:
+                combined.append(parts[0])
+                continue
+            combined.append({
+                'content': '\n\n'.join(part.get('content', '') for part in parts),
+                'source': parts[0].get('source', 'Unknown'),
+                'relevance': sum(part.get('relevance', 0.5) for part in parts) / len(parts),
+            })
+        return combined
     
     def learn_from_search(self, query: str, results: List[Dict]):
         """Learn from search results"""
-        # Store in database
-        conn = sqlite3.connect('agent_learning.db')
-        cursor = conn.cursor()
-        
-        for result in results:
-            cursor.execute('''
-                INSERT INTO search_effectiveness 
-                (search_query, source_url, content_snippet, relevance_score, timestamp)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                query,
-                result.get('source', 'Unknown'),
-                result.get('content', '')[:500],
-                result.get('relevance', 0.5),
-                datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            ))
+        # One observation per provider result, however many passages it was split into
+        results = self.merge_passages(results)
         
-        conn.commit()
-        conn.close()
+        # Store in database
+        learning_db.record_search_results(query, [
+            (result.get('source', 'Unknown'), result.get('content', '')[:500], result.get('relevance', 0.5))
+            for result in results
+        ])
         
-        # Update learning data
-        self.learning_data['successful_queries'].append({
+        # Update learning data; sync_learning_data skips the row when it reads it back
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._load_lock:
+            self._unsynced[query] += 1
+        self.similarity_index.add(query)
+        self.remember_query({
             'query': query,
-            'timestamp': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'timestamp': timestamp,
             'results_count': len(results)
         })
         
-        # Update source reliability
+        # Update source reliability (one reference: a sync may swap in a fresh dict meanwhile)
+        source_reliability = self.learning_data['source_reliability']
         for result in results:
             source = result.get('source', 'Unknown')
-            if source not in self.learning_data['source_reliability']:
-                self.learning_data['source_reliability'][source] = 0.5
+            if source not in source_reliability:
+                source_reliability[source] = 0.5
             
             # Gradually adjust reliability (simplified learning)
-            current_reliability = self.learning_data['source_reliability'][source]
+            current_reliability = source_reliability[source]
             new_reliability = (current_reliability + result.get('relevance', 0.5)) / 2
-            self.learning_data['source_reliability'][source] = new_reliability
+            source_reliability[source] = new_reliability
         
-        self.save_learning_data()
+        # The store applies the same blend atomically, so concurrent processes don't overwrite each other
+        self.store.record_search(query, len(results), timestamp, [
+            (result.get('source', 'Unknown'), result.get('relevance', 0.5)) for result in results
+        ])
     
     def format_search_results(self, results: List[Dict]) -> str:
         """Format search results for output"""
@@ -242,8 +586,81 @@ class CustomSearchEngine:
         
         return formatted
 
-# Initialize custom search engine
-custom_search_engine = CustomSearchEngine()
+_search_engine = None
+_search_engine_lock = threading.Lock()
+
+def get_search_engine() -> CustomSearchEngine:
+    """Shared custom search engine, created on first use"""
+    global _search_engine
+    if _search_engine is None:
+        with _search_engine_lock:
+            if _search_engine is None:
+                _search_engine = CustomSearchEngine()
+    return _search_engine
+
+def __getattr__(name):
+    # `custom_search_engine` used to be built at import time
+    if name == 'custom_search_engine':
+        return get_search_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def enhanced_search(query: str) -> str:
+    return get_search_engine().enhanced_search(query)
+
+# Observation returned while a provider is rate limited or its circuit is open,
+# so the agent can switch tools instead of the whole run failing
+UNAVAILABLE = "Search temporarily unavailable"
+
+def unavailable(error: ProviderUnavailable) -> str:
+    return f"{UNAVAILABLE} ({error}), try another tool."
+
+def available(output: str) -> bool:
+    """Whether a tool output is worth caching"""
+    return bool(output) and not output.startswith(UNAVAILABLE)
+
+def found_results(output: str) -> bool:
+    """Whether an Enhanced_Search output holds results, not an error or an empty search"""
+    return output.startswith("Search Results:")
+
+def duckduckgo_run(query: str) -> str:
+    try:
+        return registry.run('duckduckgo', query)
+    except ProviderUnavailable as e:
+        return unavailable(e)
+
+def wikipedia_run(query: str) -> str:
+    try:
+        return registry.run('wikipedia', query)
+    except ProviderUnavailable as e:
+        return unavailable(e)
+
+async def aenhanced_search(query: str) -> str:
+    # The first call builds the engine and loads its learning data
+    engine = await asyncio.to_thread(get_search_engine)
+    return await engine.aenhanced_search(query)
+
+async def aduckduckgo_run(query: str) -> str:
+    try:
+        return await registry.arun('duckduckgo', query)
+    except ProviderUnavailable as e:
+        return unavailable(e)
+
+async def awikipedia_run(query: str) -> str:
+    try:
+        return await registry.arun('wikipedia', query)
+    except ProviderUnavailable as e:
+        return unavailable(e)
+
+def warm_up():
+    """Create the search engine and clients ahead of the first query"""
+    get_search_engine().similarity_index
+    registry.warm_up()
+
+# Result cache shared by the search and Wikipedia tools
+result_cache = ResultCache()
+
+# Token ceilings for the text each tool returns to the agent
+context_budget = ContextBudget(QuerySimilarityIndex().vectorize)
 
 def save_to_txt(data: str, filename: str = "research_output.txt"):
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
@@ -260,132 +677,143 @@ def enhanced_save_with_learning(data: str, filename: str = "research_output.txt"
     result = save_to_txt(data, filename)
     
     # Store in learning database
-    conn = sqlite3.connect('agent_learning.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-        INSERT INTO learning_data 
-        (query, response, tools_used, success_rating, timestamp)
-        VALUES (?, ?, ?, ?, ?)
-    ''', (
+    learning_db.record_interaction(
         "Research Query",  # You can pass the actual query here
         data,
         "save_tool",
-        1.0,  # Assume successful if we're saving
-        datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    ))
-    
-    conn.commit()
-    conn.close()
+        1.0  # Assume successful if we're saving
+    )
     
     return result
 
-def view_learning_data():
-    """View learning data in human-readable format"""
+async def aenhanced_save_with_learning(data: str, filename: str = "research_output.txt"):
+    # File appends have no async API; keep them off the event loop
+    return await asyncio.to_thread(enhanced_save_with_learning, data, filename)
+
+def view_learning_data(query: str = ""):
+    """View learning data in human-readable format (query: the ignored tool input)"""
     try:
-        # Load pickle data
-        if os.path.exists("search_learning.pkl"):
-            with open("search_learning.pkl", 'rb') as f:
-                learning_data = pickle.load(f)
-            
+        # Load stored learning state
+        store = get_search_engine().store
+        recent_queries = store.load_queries(limit=10)
+        source_reliability = store.load_source_reliability()
+        if recent_queries or source_reliability:
             output = "=== LEARNING DATA ===\n\n"
             
             # Show successful queries
             output += "Recent Successful Queries:\n"
-            for i, query in enumerate(learning_data['successful_queries'][-10:], 1):  # Last 10
+            for i, query in enumerate(recent_queries, 1):  # Last 10
                 output += f"{i}. Query: {query['query']}\n"
                 output += f"   Timestamp: {query['timestamp']}\n"
                 output += f"   Results Count: {query['results_count']}\n\n"
             
             # Show source reliability
             output += "\nSource Reliability Scores:\n"
-            for source, score in learning_data['source_reliability'].items():
+            for source, score in source_reliability.items():
                 output += f"- {source}: {score:.2f}\n"
             
             # Show database data
-            conn = sqlite3.connect('agent_learning.db')
-            cursor = conn.cursor()
-            
-            cursor.execute('SELECT query, timestamp FROM learning_data ORDER BY timestamp DESC LIMIT 10')
-            recent_interactions = cursor.fetchall()
+            recent_interactions = learning_db.recent_interactions(limit=10)
             
             output += "\nRecent Interactions:\n"
             for i, (query, timestamp) in enumerate(recent_interactions, 1):
                 output += f"{i}. {query} ({timestamp})\n"
             
-            conn.close()
-            
             return output
         else:
-            return "No learning data file found yet. Start researching to build learning data!"
+            return "No learning data found yet. Start researching to build learning data!"
             
     except Exception as e:
         return f"Error reading learning data: {str(e)}"
 
-def analyze_learning_data():
-    """Analyze learning data and provide insights"""
-    conn = sqlite3.connect('agent_learning.db')
-    cursor = conn.cursor()
-    
+def analyze_learning_data(query: str = ""):
+    """Analyze learning data and provide insights (query: the ignored tool input)"""
     # Get learning statistics
-    cursor.execute('SELECT COUNT(*) FROM learning_data')
-    total_interactions = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT AVG(success_rating) FROM learning_data')
-    avg_success = cursor.fetchone()[0] or 0
-    
-    cursor.execute('SELECT COUNT(*) FROM search_effectiveness')
-    total_searches = cursor.fetchone()[0]
-    
-    cursor.execute('SELECT AVG(relevance_score) FROM search_effectiveness')
-    avg_relevance = cursor.fetchone()[0] or 0
-    
-    conn.close()
+    stats = learning_db.learning_stats()
     
     analysis = f"""
 Learning Analysis:
-- Total Interactions: {total_interactions}
-- Average Success Rating: {avg_success:.2f}
-- Total Searches Performed: {total_searches}
-- Average Search Relevance: {avg_relevance:.2f}
+- Total Interactions: {stats['total_interactions']}
+- Average Success Rating: {stats['avg_success']:.2f}
+- Total Searches Performed: {stats['total_searches']}
+- Average Search Relevance: {stats['avg_relevance']:.2f}
+
+Result Cache:
+{result_cache.summary()}
+
+Search Providers:
+{registry.summary()}
+
+Context Budget:
+{context_budget.summary()}
+
+Retention:
+{learning_db.get_retention().summary()}
     """
     
     return analysis
 
+async def aview_learning_data(query: str = ""):
+    return await asyncio.to_thread(view_learning_data)
+
+async def aanalyze_learning_data(query: str = ""):
+    return await asyncio.to_thread(analyze_learning_data)
+
 # Create enhanced tools
+# Every tool has a coroutine variant, used when the agent runs with ainvoke()
 save_tool = Tool(
     name="save_to_txt_file",
     func=enhanced_save_with_learning,
+    coroutine=aenhanced_save_with_learning,
     description="saves structured research data to a text file and learns from the interaction"
 )
 
 # Enhanced search tool with custom search engine
 enhanced_search_tool = Tool(
     name="Enhanced_Search",
-    func=custom_search_engine.enhanced_search,
+    func=result_cache.cached(
+        "Enhanced_Search",
+        context_budget.budgeted("Enhanced_Search", enhanced_search),
+        cacheable=found_results
+    ),
+    coroutine=result_cache.acached(
+        "Enhanced_Search",
+        context_budget.abudgeted("Enhanced_Search", aenhanced_search),
+        cacheable=found_results
+    ),
     description="Enhanced web search with learning capabilities and multiple search strategies"
 )
 
 # Keep original tools for backward compatibility
-search = DuckDuckGoSearchRun()
 search_tool = Tool(
     name="Search",
-    func=search.run,
+    func=result_cache.cached("Search", context_budget.budgeted("Search", duckduckgo_run), cacheable=available),
+    coroutine=result_cache.acached("Search", context_budget.abudgeted("Search", aduckduckgo_run), cacheable=available),
     description="search the web for information using DuckDuckGo"
 )
 
-api_wrapper = WikipediaAPIWrapper(top_k_results=1, doc_content_chars_max=1000)
-wiki_tool = WikipediaQueryRun(api_wrapper=api_wrapper)
+wiki_tool = Tool(
+    name="wikipedia",
+    func=result_cache.cached("wikipedia", context_budget.budgeted("wikipedia", wikipedia_run), cacheable=available),
+    coroutine=result_cache.acached("wikipedia", context_budget.abudgeted("wikipedia", awikipedia_run), cacheable=available),
+    description=(
+        "A wrapper around Wikipedia. Useful for when you need to answer general questions about "
+        "people, places, companies, facts, historical events, or other subjects. "
+        "Input should be a search query."
+    )
+)
 
 # Learning tools
 learning_analysis_tool = Tool(
     name="Learning_Analysis",
-    func=analyze_learning_data,
+    func=context_budget.budgeted("Learning_Analysis", analyze_learning_data),
+    coroutine=context_budget.abudgeted("Learning_Analysis", aanalyze_learning_data),
     description="Analyze the agent's learning data and performance metrics"
 )
 
 learning_viewer_tool = Tool(
     name="View_Learning_Data",
-    func=view_learning_data,
+    func=context_budget.budgeted("View_Learning_Data", view_learning_data),
+    coroutine=context_budget.abudgeted("View_Learning_Data", aview_learning_data),
     description="View all stored learning data in human-readable format"
 )
\ No newline at end of file